@@ -4,6 +4,7 @@ sort them.
 """
 __author__ = 'laharah'
 
+import json
 import re
 from collections import namedtuple
 
@@ -14,7 +15,17 @@ from filebottool.common import LOG
 
 log = LOG
 
-VALID_FIELDS = ['label', 'tracker', 'save_path', 'file path']
+# fields evaluated from the torrent's probed media info, a rule matches if any
+# of the torrent's video files matches it
+MEDIA_FIELDS = {
+    'resolution': 'resolution',
+    'video format': 'video_format',
+    'video codec': 'video_codec',
+    'duration (minutes)': 'duration',
+    'hdr': 'hdr',
+}
+
+VALID_FIELDS = ['label', 'tracker', 'save_path', 'file path'] + sorted(MEDIA_FIELDS)
 
 OPERATOR_MAP = {
     "is exactly": lambda x, y: x == y,
@@ -28,15 +39,38 @@ FilterRule = namedtuple("FilterRule", ["id", "field", "operator", "value",
                                        "handler_name"])
 
 
-def check_rules(torrent_id, sorting_rules):
+def rule_key(rule):
+    """returns a key identifying a rule by its contents. Rule ids are not
+    stable, they are renumbered whenever the rules are saved."""
+    rule = FilterRule(*rule)
+    return json.dumps([rule.field, rule.operator, rule.value, rule.handler_name])
+
+
+def uses_media_fields(sorting_rules):
+    """returns True if any of the rules needs media info"""
+    return any(FilterRule(*rule).field in MEDIA_FIELDS for rule in sorting_rules)
+
+
+def check_rules(torrent_id, sorting_rules, media_lookup=None):
     """
     match sorting rules to a torrent id and get appropriate handler
     Args:
         torrent_id: torrent_id
         sorting_rules: list of rule tuples
+        media_lookup: function taking a torrent_id and returning a list of
+            media info dictionaries for its files. Rules on media fields
+            never match without it.
 
     Returns: handler name or None
     """
+    rule = match_rule(torrent_id, sorting_rules, media_lookup)
+    return rule.handler_name if rule else None
+
+
+def match_rule(torrent_id, sorting_rules, media_lookup=None):
+    """
+    same as *check_rules*, but returns the FilterRule that matched or None
+    """
     core = component.get('Core')
     sorting_rules = [FilterRule(*rule) for rule in sorting_rules]
 
@@ -49,7 +83,17 @@ def check_rules(torrent_id, sorting_rules):
             else:
                 if OPERATOR_MAP[rule.operator](lable_name, rule.value):
                     log.info("Torrent {0} matched rule {1}".format(torrent_id, rule.id))
-                    return rule.handler_name
+                    return rule
+
+        if rule.field in MEDIA_FIELDS:
+            if media_lookup is None:
+                continue
+            key = MEDIA_FIELDS[rule.field]
+            for info in media_lookup(torrent_id):
+                if OPERATOR_MAP[rule.operator](info.get(key) or '', rule.value):
+                    log.info("Torrent {0} matched rule {1}".format(torrent_id, rule.id))
+                    return rule
+            continue
 
         if rule.field == 'file path':  # special handeling for file path
             files = component.get('TorrentManager')[torrent_id].get_files()
@@ -57,7 +101,7 @@ def check_rules(torrent_id, sorting_rules):
                 if OPERATOR_MAP[rule.operator](f['path'], rule.value):
                     logline ='Torrent:file {0}:{1} matched rule {2}'
                     log.info(logline.format(torrent_id, f['path'], rule.id))
-                    return rule.handler_name
+                    return rule
 
 
         else:
@@ -68,7 +112,7 @@ def check_rules(torrent_id, sorting_rules):
                 continue
             if OPERATOR_MAP[rule.operator](field, rule.value):
                 log.info("Torrent {0} matched rule {1}".format(torrent_id, rule.id))
-                return rule.handler_name
+                return rule
 
     else:
         log.debug("No rule filter matched for torrent {0}".format(torrent_id))
@@ -0,0 +1,122 @@
+"""
+Circuit breaker that stops FileBotTool from launching FileBot while it is
+missing, broken or unlicensed.
+"""
+from __future__ import absolute_import
+__author__ = 'laharah'
+
+import time
+
+from filebottool.common import LOG
+from filebottool import pyfilebot
+
+log = LOG
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+FATAL = "fatal"
+LICENSE = "license"
+
+
+class FileBotUnavailableError(pyfilebot.FilebotFatalError):
+    """raised instead of running FileBot while the circuit breaker is open"""
+
+    pass
+
+
+class CircuitBreaker(object):
+    """
+    Records fatal and license failures of FileBot runs.
+
+    A failure opens the breaker and jobs are refused. After *cooldown* seconds
+    the breaker is half-open: a single trial job is let through and its
+    result decides whether it closes or opens again. A trial that reports
+    nothing for another *cooldown* seconds is given to the next job.
+    """
+
+    def __init__(self, cooldown=300):
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.kind = None
+        self.reason = None
+        self.opened_at = None
+        self.failures = 0
+        self.trial_started = None
+
+    @property
+    def closed(self):
+        return self.state == CLOSED
+
+    def cooled_down(self, now=None):
+        now = now or time.time()
+        return self.opened_at is not None and now - self.opened_at >= self.cooldown
+
+    def allow(self, now=None):
+        """returns True if a job may run FileBot, half-opening the breaker if
+        the cooldown has passed. While half-open only the trial job may."""
+        now = now or time.time()
+        if self.state == OPEN and self.cooled_down(now):
+            self.half_open()
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and (self.trial_started is None or
+                                        now - self.trial_started >= self.cooldown):
+            self.trial_started = now
+            return True
+        return False
+
+    def release(self):
+        """gives the half-open trial back, for a job that was allowed but did
+        not run FileBot after all"""
+        self.trial_started = None
+
+    def half_open(self):
+        if self.state == OPEN:
+            log.info("FileBot circuit breaker half-open, trying again.")
+            self.state = HALF_OPEN
+            self.trial_started = None
+
+    def record_failure(self, kind, reason):
+        """opens the breaker. *kind* is FATAL or LICENSE"""
+        if self.state == CLOSED:
+            log.warning("FileBot circuit breaker open: {0}".format(reason))
+        self.state = OPEN
+        self.kind = kind
+        self.reason = reason
+        self.opened_at = time.time()
+        self.failures += 1
+        self.trial_started = None
+
+    def record_success(self):
+        """closes the breaker. returns True if it was not closed before"""
+        if self.state == CLOSED:
+            return False
+        log.info("FileBot circuit breaker closed, FileBot is available again.")
+        self.state = CLOSED
+        self.kind = None
+        self.reason = None
+        self.opened_at = None
+        self.failures = 0
+        self.trial_started = None
+        return True
+
+    def error(self):
+        """returns the error refused jobs fail with"""
+        retry = ""
+        if self.opened_at is not None:
+            retry = " Retrying in {0} seconds.".format(
+                max(0, int(self.opened_at + self.cooldown - time.time())))
+        return FileBotUnavailableError(
+            "FileBot is unavailable ({0} failure): {1}{2}".format(
+                self.kind, self.reason, retry))
+
+    def get_status(self):
+        return {
+            "state": self.state,
+            "kind": self.kind,
+            "reason": self.reason,
+            "opened_at": self.opened_at,
+            "failures": self.failures,
+        }
@@ -38,6 +38,8 @@
 #
 from __future__ import absolute_import
 import os
+import re
+import time
 import tempfile
 
 # noinspection PyUnresolvedReferences
@@ -52,11 +54,21 @@ from deluge._libtorrent import lt
 import deluge.configmanager
 # noinspection PyUnresolvedReferences
 from deluge.core.rpcserver import export
-from twisted.internet import threads, defer
+from twisted.internet import threads, defer, reactor, task
 
 from . import pyfilebot
 from filebottool.common import LOG, version_tuple
 import filebottool.auto_sort
+import filebottool.circuit
+import filebottool.dedup
+import filebottool.io_lanes
+import filebottool.match_cache
+import filebottool.rate_limit
+import filebottool.releases
+import filebottool.schedule
+import filebottool.media_cache
+import filebottool.subtitle_cache
+import filebottool.warmup
 import filebottool.events as events
 import six
 from six.moves import zip
@@ -85,6 +97,64 @@ DEFAULT_PREFS = {
     "auto_sort_rules": [],
 }
 
+DEFAULT_PLUGIN_PREFERENCES = {
+    "dedup_enabled": False,
+    "no_match_cache_ttl": 15 * 60,
+    "no_match_cache_max_ttl": 24 * 60 * 60,
+    "match_memo_confirmations": 3,
+    "classify_releases": False,
+    "collapse_target_threshold": None,  # eg 50, None never targets folders
+    "max_parallel_runs": 4,
+    "incremental_batch_delay": 10,
+    "speculative_matching": False,
+    "speculative_delay": 30,
+    "prematch_ttl": 24 * 60 * 60,
+    "predictive_warmup": False,
+    "warmup_check_interval": 60,
+    "warmup_window": 120,
+    "warmup_interval": 240,
+    "warmup_ttl": 300,
+    "isolated_workers": False,
+    "cache_merge_interval": 600,
+    "launch_profiles": {"default": {}},
+    "subtitle_batch_delay": 30,
+    "subtitle_batch_size": 200,
+    "subtitle_cache_ttl": 7 * 24 * 60 * 60,
+    "filebot_timeout": None,  # seconds, moves of large files can take hours
+    "circuit_cooldown": 5 * 60,
+    "circuit_probe_interval": 60,
+    "database_rate_limits": {"AniDB": {"runs_per_minute": 2, "burst": 1}},
+    "io_lane_concurrency": 1,
+    "resource_policies": {"default": {}},
+    "cgroup_root": None,
+    # {auto_sort.rule_key(rule): "HH:MM-HH:MM"}
+    "rule_schedule_windows": {},
+}
+
+# rename actions that would write a second copy of already imported content
+DEDUP_ACTIONS = ["copy", "duplicate"]
+
+# rename actions that don't copy or move file data, and skip the I/O lanes.
+# Copies always take the lane, moves only onto another device. The lane is
+# taken by the first filebot run of a torrent, once its rate limit allows
+LANE_FREE_ACTIONS = ["test", "symlink", "hardlink", "reflink"]
+
+# rename actions that leave the torrent's own files in place
+INCREMENTAL_ACTIONS = ["copy", "duplicate", "hardlink", "symlink", "reflink"]
+
+# format bindings that read the files, they can't be evaluated before the
+# files are complete
+CONTENT_BINDINGS = ["vf", "vc", "ac", "af", "vs", "hdr", "resolution", "dim",
+                    "width", "height", "ws", "hd", "fps", "bitdepth", "channels",
+                    "aco", "kbps", "mbps", "khz", "crc32", "sfv", "media", "video",
+                    "audio", "text", "mediaInfo", "minutes", "hours", "duration",
+                    "seconds", "bytes", "megabytes", "gigabytes", "xattr"]
+
+# stages of saved jobs, see Core._save_job
+JOB_PENDING = "pending"  # waiting to be auto sorted
+JOB_RENAMING = "renaming"  # filebot run started
+JOB_RELOCATING = "relocating"  # filebot done, deluge paths being redirected
+
 
 class Core(CorePluginBase):
     """The Plugin Core"""
@@ -94,6 +164,19 @@ class Core(CorePluginBase):
         self.config = deluge.configmanager.ConfigManager(
             "filebottool.conf", DEFAULT_PREFS)
 
+        self.circuit = filebottool.circuit.CircuitBreaker(
+            self._get_preference("circuit_cooldown"))
+        self.circuit_queue = []
+        self.circuit_granted = set()  # auto sorts the breaker already let run
+        self.rate_limiter = filebottool.rate_limit.RateLimiter(
+            self._get_preference("database_rate_limits"))
+        self.io_lanes = filebottool.io_lanes.IOLanes(
+            self._get_preference("io_lane_concurrency"))
+        self.job_store = deluge.configmanager.ConfigManager(
+            "filebottool_jobs.conf", {"parked": [], "jobs": {}})
+        self.schedule_timers = {}
+        for window in set(job["window"] for job in self.job_store["parked"]):
+            self._schedule_window_timer(window)
         try:
             self.filebot_version = pyfilebot.get_version()
             log.info("Filebot Found with version {0}".format(
@@ -101,32 +184,101 @@ class Core(CorePluginBase):
         except pyfilebot.FilebotFatalError as e:
             log.error('FilebotFatalError Encountered', exc_info=True)
             self.filebot_version = None
+            self.circuit.record_failure(filebottool.circuit.FATAL, str(e.msg))
+        self.circuit_loop = task.LoopingCall(self._probe_filebot)
+        self.circuit_loop.start(self._get_preference("circuit_probe_interval"),
+                                now=False)
 
+        self._configure_pyfilebot()
         self.torrent_manager = component.get("TorrentManager")
         plugin_info = component.get("CorePluginManager").get_plugin_info("FileBotTool")
         self.plugin_version = version_tuple(plugin_info["Version"])
         self.listening_dictionary = {}
         self.processing_torrents = {}
+        self.incremental_sorts = {}
+        self.prematched = {}
+        self.prematch_lock = defer.DeferredSemaphore(1)
+        self.warmup_policy = filebottool.warmup.WarmupPolicy()
+        self._configure_warmup_policy()
+        self.warmup_rule_matches = {}
+        self.warmup_loop = task.LoopingCall(self._check_warmup)
+        self.warmup_loop.start(self._get_preference("warmup_check_interval"),
+                               now=False)
+        self.subtitle_queue = []
+        self.subtitle_timer = None
+        self.subtitle_cache = filebottool.subtitle_cache.SubtitleCache(
+            deluge.configmanager.ConfigManager("filebottool_subtitle_cache.conf",
+                                               {"entries": {}}),
+            self._get_preference("subtitle_cache_ttl"))
+        self.subtitle_cache.prune()
+        self.media_cache = filebottool.media_cache.MediaInfoCache(
+            deluge.configmanager.ConfigManager("filebottool_media_cache.conf",
+                                               {"entries": {}}))
+        self.media_cache.prune()
+        self.dedup_index = filebottool.dedup.DedupIndex(
+            deluge.configmanager.ConfigManager("filebottool_dedup.conf",
+                                               {"index": {}}))
+        self.negative_cache = filebottool.match_cache.NegativeCache(
+            self._get_preference("no_match_cache_ttl"),
+            self._get_preference("no_match_cache_max_ttl"))
+        self.match_memo = filebottool.match_cache.MatchMemo(
+            deluge.configmanager.ConfigManager("filebottool_match_memo.conf",
+                                               {"memo": {}, "candidates": {}}),
+            self._get_preference("match_memo_confirmations"))
 
         #register event/alert hooks:
         component.get("AlertManager").register_handler("storage_moved_alert",
                                                        self._on_storage_moved)
+        component.get("AlertManager").register_handler("metadata_received_alert",
+                                                       self._on_metadata_received)
         event_manager = component.get("EventManager")
         event_manager.register_event_handler("TorrentFolderRenamedEvent",
                                              self._on_folder_renamed)
         event_manager.register_event_handler("TorrentFileRenamedEvent",
                                              self._on_file_renamed)
         event_manager.register_event_handler("TorrentFinishedEvent", self._auto_sort)
+        event_manager.register_event_handler("TorrentFileCompletedEvent",
+                                             self._on_file_completed)
+        event_manager.register_event_handler("TorrentAddedEvent",
+                                             self._on_torrent_added)
+        event_manager.register_event_handler("TorrentRemovedEvent",
+                                             self._on_torrent_removed)
+        event_manager.register_event_handler("SessionStartedEvent",
+                                             self._resume_jobs)
         self.event_manager = event_manager
+        # enabled while the daemon runs, the session's torrents are loaded
+        if component.get("CorePluginManager").get_state() == "Started":
+            self._resume_jobs()
 
     def disable(self):
         component.get("AlertManager").deregister_handler(self._on_storage_moved)
+        component.get("AlertManager").deregister_handler(self._on_metadata_received)
         event_manager = self.event_manager
         event_manager.deregister_event_handler("TorrentFolderRenamedEvent",
                                                self._on_folder_renamed)
         event_manager.deregister_event_handler("TorrentFileRenamedEvent",
                                                self._on_file_renamed)
         event_manager.deregister_event_handler("TorrentFinishedEvent", self._auto_sort)
+        event_manager.deregister_event_handler("TorrentFileCompletedEvent",
+                                               self._on_file_completed)
+        event_manager.deregister_event_handler("TorrentAddedEvent",
+                                               self._on_torrent_added)
+        event_manager.deregister_event_handler("TorrentRemovedEvent",
+                                               self._on_torrent_removed)
+        event_manager.deregister_event_handler("SessionStartedEvent",
+                                               self._resume_jobs)
+        for torrent_id in list(self.incremental_sorts):
+            self._drop_incremental_sort(torrent_id)
+        if self.warmup_loop.running:
+            self.warmup_loop.stop()
+        if self.circuit_loop.running:
+            self.circuit_loop.stop()
+        self.rate_limiter.cancel()
+        for timer in self.schedule_timers.values():
+            if timer.active():
+                timer.cancel()
+        if self.subtitle_timer and self.subtitle_timer.active():
+            self.subtitle_timer.cancel()
 
     def update(self):
         pass
@@ -183,23 +335,536 @@ class Core(CorePluginBase):
 
         log.debug("listening dictionary updated: {0}".format(self.listening_dictionary))
 
+    @defer.inlineCallbacks
     def _auto_sort(self, torrent_id):
         """called on completed torrents for matching auto sort rules"""
+        self._save_job(torrent_id, JOB_PENDING)
         rules = self.config["auto_sort_rules"]
-        handler = filebottool.auto_sort.check_rules(torrent_id, rules)
+        allowed = False
+        if filebottool.auto_sort.uses_media_fields(rules):
+            # probing runs filebot too, don't start it while the breaker is open
+            allowed = self.circuit.allow()
+            if not allowed:
+                self._hold_torrent(torrent_id)
+                return
+            try:
+                yield self._probe_media(torrent_id)
+            except pyfilebot.Error:
+                log.warning("Could not probe media info of torrent {0}, media "
+                            "rules will not match.".format(torrent_id), exc_info=True)
+        rule = filebottool.auto_sort.match_rule(torrent_id, rules,
+                                                self._cached_media_info)
+        handler = rule.handler_name if rule else None
+        if handler and not (allowed or self.circuit.allow()):
+            self._hold_torrent(torrent_id)
+            return
+        self.warmup_rule_matches.pop(torrent_id, None)
+        if handler:
+            self.warmup_policy.record_completion()
         if not handler:  # pass through processing so every torrent emits finished event
+            if allowed:
+                self.circuit.release()
             self._mark_processing(torrent_id)
             self._finish_processing(torrent_id)
+            return
+        window = self._schedule_window(
+            rule, self.config["saved_handlers"].get(handler, {}))
+        if window and not filebottool.schedule.is_open(window):
+            self.circuit.release()  # no filebot run until the window opens
+            self._park_job(torrent_id, handler, window)
+            self._drop_job(torrent_id)
+            return
+        self._sort_with_handler(torrent_id, handler, allowed=True)
+
+    def _sort_with_handler(self, torrent_id, handler, allowed=False):
+        """starts auto sorting a torrent with the named handler. *allowed*
+        passes on that the circuit breaker already let this sort run, so
+        do_rename doesn't ask it again for a half-open trial it holds"""
+        try:
+            handler_settings = self.config["saved_handlers"][handler]
+        except KeyError:
+            msg = "no handler with name '{0}' could be found!".format(handler)
+            log.error(msg)
+            if allowed:
+                self.circuit.release()
+            self._mark_processing(torrent_id)
+            self._finish_processing(torrent_id, error=msg)
+            return
+        if allowed:
+            self.circuit_granted.add(torrent_id)
+        self._mark_processing(torrent_id, handler)
+        self.do_rename([torrent_id], handler_settings=handler_settings)
+
+    def _schedule_window(self, rule, handler_settings):
+        """returns the schedule window for an auto sort, the rule's window
+        taking precedence over the handler's, or None to sort right away"""
+        windows = self._get_preference("rule_schedule_windows")
+        window = (windows.get(filebottool.auto_sort.rule_key(rule)) or
+                  handler_settings.get("schedule_window"))
+        if not window:
+            return None
+        try:
+            filebottool.schedule.parse_window(window)
+        except ValueError:
+            log.error("Ignoring invalid schedule window '{0}'".format(window))
+            return None
+        return window
+
+    def _park_job(self, torrent_id, handler_name, window):
+        """holds an auto sort until its schedule window opens. Parked jobs
+        are saved and survive restarts."""
+        parked = self.job_store["parked"]
+        if any(job["torrent_id"] == torrent_id for job in parked):
+            return
+        log.info("Parking torrent {0} until its schedule window {1}".format(
+            torrent_id, window))
+        parked.append({"torrent_id": torrent_id, "handler_name": handler_name,
+                       "window": window, "parked_at": time.time()})
+        self.job_store.save()
+        self._schedule_window_timer(window)
+
+    def _schedule_window_timer(self, window):
+        timer = self.schedule_timers.get(window)
+        if timer and timer.active():
+            return
+        try:
+            delay = filebottool.schedule.seconds_until_open(window)
+        except ValueError:  # parked by a version accepting empty windows
+            delay = 0
+        self.schedule_timers[window] = reactor.callLater(delay, self._drain_parked,
+                                                         window)
+
+    def _drain_parked(self, window):
+        """starts every job parked for a window that just opened"""
+        self.schedule_timers.pop(window, None)
+        try:
+            is_open = filebottool.schedule.is_open(window)
+        except ValueError:
+            is_open = True
+        if not is_open:  # clock changed
+            self._schedule_window_timer(window)
+            return
+        jobs = [job for job in self.job_store["parked"] if job["window"] == window]
+        self.job_store["parked"] = [job for job in self.job_store["parked"]
+                                    if job["window"] != window]
+        self.job_store.save()
+        log.info("Schedule window {0} open, sorting {1} parked torrents".format(
+            window, len(jobs)))
+        for job in jobs:
+            if job["torrent_id"] not in self.torrent_manager.torrents:
+                continue
+            if not self.circuit.allow():
+                if job["torrent_id"] not in self.circuit_queue:
+                    self.circuit_queue.append(job["torrent_id"])
+                continue
+            self._sort_with_handler(job["torrent_id"], job["handler_name"],
+                                    allowed=True)
+
+    def _hold_torrent(self, torrent_id):
+        """holds an auto sort until the circuit breaker closes"""
+        log.warning("FileBot is unavailable, holding torrent {0} until it "
+                    "recovers.".format(torrent_id))
+        if torrent_id not in self.circuit_queue:
+            self.circuit_queue.append(torrent_id)
+
+    def _save_job(self, torrent_id, stage, **info):
+        """saves the stage a torrent's job reached, so it can be resumed
+        after a restart. *info* is stored with the job."""
+        job = self.job_store["jobs"].setdefault(torrent_id, {})
+        job.update(info)
+        job["stage"] = stage
+        job["updated"] = time.time()
+        self.job_store.save()
+
+    def _drop_job(self, torrent_id):
+        if self.job_store["jobs"].pop(torrent_id, None) is not None:
+            self.job_store.save()
+
+    def _resume_jobs(self):
+        """resumes the jobs saved before the last shutdown from the stage
+        they reached"""
+        jobs = self.job_store["jobs"]
+        for torrent_id, job in list(jobs.items()):
+            del jobs[torrent_id]
+            if torrent_id not in self.torrent_manager.torrents:
+                log.info("Dropping saved job of removed torrent {0}".format(
+                    torrent_id))
+                continue
+            if torrent_id in self.processing_torrents:
+                continue
+            log.info("Resuming {0} job of torrent {1}".format(job["stage"],
+                                                               torrent_id))
+            if job["stage"] == JOB_PENDING:
+                torrent = self.torrent_manager[torrent_id]
+                if torrent.get_status(["is_finished"])["is_finished"]:
+                    self._auto_sort(torrent_id)
+                continue
+            # jobs were marked processing before the restart
+            jobs[torrent_id] = job
+            settings = job["handler_settings"]
+            self.processing_torrents[torrent_id] = {
+                "state": job["state"],
+                "handler_name": job.get("handler_name",
+                                        settings.get("handler_name"))}
+            if job["stage"] == JOB_RENAMING:
+                self._resume_rename(torrent_id, job)
+            else:
+                self._resume_relocation(torrent_id, job)
+        self.job_store.save()
+
+    @defer.inlineCallbacks
+    def _resume_rename(self, torrent_id, job):
+        """restarts a filebot run if it had not moved any files yet. Files an
+        interrupted run did move are looked up in filebot's history, and the
+        torrent is redirected to where they are."""
+        moved = set(f for f in job["files"] if not os.path.exists(f))
+        if not moved:
+            self.do_rename([torrent_id], handler_settings=job["handler_settings"])
+            return
+        self.torrent_manager[torrent_id].pause()
+        movements = None
+        try:
+            history = yield threads.deferToThread(pyfilebot.get_history,
+                                                  job["files"])
+            moves = dict((a, b) if a in moved else (b, a) for a, b in history
+                         if a in moved or b in moved)
+            if set(moves) == moved:
+                movements = self._translate_filebot_movements(
+                    torrent_id, list(moves.items()))
+        except (pyfilebot.Error, KeyError):
+            log.warning("Could not rebuild the moves of torrent {0} from "
+                        "FileBot history".format(torrent_id), exc_info=True)
+        if movements:
+            log.info("Redirecting torrent {0} to the {1} files FileBot moved "
+                     "before the restart".format(torrent_id, len(moved)))
+            self._save_job(torrent_id, JOB_RELOCATING, movements=movements)
+            self._redirect_torrent_paths(torrent_id, movements)
+            return
+        msg = ("FileBot run was interrupted after moving {0} of {1} files, "
+               "they will have to be sorted or reverted by hand.".format(
+                   len(moved), len(job["files"])))
+        log.error("Can't resume torrent {0}: {1}".format(torrent_id, msg))
+        # its files are missing, leave it paused instead of resuming it
+        self.processing_torrents[torrent_id]["state"] = "Paused"
+        self._finish_processing(torrent_id, error=msg)
+
+    def _resume_relocation(self, torrent_id, job):
+        """redirects the torrent paths that deluge had not moved yet"""
+        new_save_path, new_top_lvl, new_file_paths = job["movements"]
+        torrent = self.torrent_manager[torrent_id]
+        if new_save_path == torrent.get_status(["save_path"])["save_path"]:
+            new_save_path = None
+        files = torrent.get_files()
+        if new_top_lvl and files[0]["path"].split("/")[0] == new_top_lvl:
+            new_top_lvl = None
+        new_file_paths = [(index, path) for index, path in new_file_paths
+                          if files[index]["path"] != path]
+        self._redirect_torrent_paths(torrent_id, (new_save_path, new_top_lvl,
+                                                  new_file_paths))
+
+    @defer.inlineCallbacks
+    def _probe_filebot(self):
+        """periodic half-open probe while the circuit breaker is open. A
+        working FileBot closes the breaker after a fatal failure. After a
+        license failure it lets one held torrent through to find out if the
+        license works again."""
+        if self.circuit.state == filebottool.circuit.HALF_OPEN:
+            if self.circuit.allow():  # the last trial never reported back
+                self.circuit.release()
+                self._release_held_torrents(1)
+            return
+        if self.circuit.state != filebottool.circuit.OPEN or not self.circuit.cooled_down():
+            return
+        try:
+            version = yield threads.deferToThread(pyfilebot.get_version)
+        except pyfilebot.Error as err:
+            log.debug("FileBot probe failed: {0}".format(err.msg))
+            self.circuit.record_failure(filebottool.circuit.FATAL, str(err.msg))
+            return
+        self.filebot_version = version
+        if self.circuit.kind == filebottool.circuit.FATAL:
+            self._filebot_succeeded()
         else:
-            try:
-                handler_settings = self.config["saved_handlers"][handler]
-            except KeyError:
-                msg = "no handler with name '{0}' could be found!".format(handler)
-                log.error(msg)
-                self._mark_processing(torrent_id)
-                self._finish_processing(torrent_id, error=msg)
-            self._mark_processing(torrent_id, handler)
-            self.do_rename([torrent_id], handler_settings=handler_settings)
+            self.circuit.half_open()
+            self._release_held_torrents(1)
+
+    def _filebot_succeeded(self):
+        """closes the circuit breaker and resumes held torrents"""
+        if self.circuit.record_success():
+            self._release_held_torrents()
+
+    def _release_held_torrents(self, count=None):
+        held = self.circuit_queue[:count] if count else self.circuit_queue[:]
+        self.circuit_queue = self.circuit_queue[len(held):]
+        for torrent_id in held:
+            if torrent_id in self.torrent_manager.torrents:
+                log.info("Resuming held torrent {0}".format(torrent_id))
+                self._auto_sort(torrent_id)
+
+    def _media_files(self, torrent_id):
+        return [t for t in self._get_filebot_target(torrent_id)
+                if filebottool.media_cache.is_video(t)]
+
+    def _probe_media(self, torrent_id):
+        """probes the media info of a torrent's video files into the cache.
+        returns: deferred firing with {path: info}"""
+        return threads.deferToThread(self.media_cache.probe,
+                                     self._media_files(torrent_id),
+                                     pyfilebot.mediainfo)
+
+    def _cached_media_info(self, torrent_id):
+        """returns the cached media info of a torrent's video files"""
+        infos = (self.media_cache.lookup(f) for f in self._media_files(torrent_id))
+        return [info for info in infos if info is not None]
+
+    def _on_file_completed(self, torrent_id, index):
+        """handler for completed files (libtorrent's file_completed_alert),
+        queues them for incremental sorting if the torrent's auto sort
+        handler has it enabled."""
+        state = (self.incremental_sorts.get(torrent_id) or
+                 self._start_incremental_sort(torrent_id))
+        if not state:
+            return
+        log.debug("file {0} of torrent {1} completed".format(index, torrent_id))
+        state["pending"].add(index)
+        if not (state["timer"] and state["timer"].active()):
+            state["timer"] = reactor.callLater(
+                self._get_preference("incremental_batch_delay"),
+                self._sort_completed_files, torrent_id)
+
+    def _on_torrent_added(self, torrent_id, from_state):
+        """handler for added torrents, schedules a speculative match once the
+        torrent's files are known"""
+        if from_state:  # torrents restored at startup
+            return
+        if self.torrent_manager[torrent_id].get_files():
+            self._schedule_prematch(torrent_id)
+
+    def _on_torrent_removed(self, torrent_id):
+        """handler for removed torrents, drops their per-torrent state"""
+        self._drop_incremental_sort(torrent_id)
+        self.prematched.pop(torrent_id, None)
+        self.subtitle_queue = [e for e in self.subtitle_queue
+                               if e["torrent_id"] != torrent_id]
+
+    def _on_metadata_received(self, alert):
+        """handler for magnet links receiving their metadata"""
+        self._schedule_prematch(str(alert.handle.info_hash()))
+
+    #########
+    #  Section: Predictive warm-up
+    #########
+
+    def _configure_warmup_policy(self):
+        self.warmup_policy.window = self._get_preference("warmup_window")
+        self.warmup_policy.interval = self._get_preference("warmup_interval")
+        self.warmup_policy.ttl = self._get_preference("warmup_ttl")
+
+    def _check_warmup(self):
+        """starts a cheap filebot run if a torrent matching an auto sort rule
+        is expected to complete within the warm-up window, so the JVM and
+        FileBot's caches are hot when it does."""
+        if (not self._get_preference("predictive_warmup") or
+                not self.circuit.closed or
+                not self.warmup_policy.should_warm()):
+            return
+        for torrent_id, torrent in list(self.torrent_manager.torrents.items()):
+            status = torrent.get_status(["state", "eta"])
+            if status["state"] not in ("Downloading", "Queued"):
+                continue
+            if not self.warmup_policy.expected_soon(status["eta"]):
+                continue
+            if torrent_id not in self.warmup_rule_matches:
+                self.warmup_rule_matches[torrent_id] = (
+                    filebottool.auto_sort.check_rules(
+                        torrent_id, self.config["auto_sort_rules"],
+                        self._cached_media_info))
+            if self.warmup_rule_matches[torrent_id]:
+                log.debug("Warming up FileBot for torrent {0}, eta {1}s".format(
+                    torrent_id, status["eta"]))
+                self.warmup_policy.record_warmup()
+                d = threads.deferToThread(pyfilebot.get_version)
+                d.addErrback(lambda f: log.debug("FileBot warm-up failed: {0}".format(
+                    f.value)))
+                return
+
+    #########
+    #  Section: Speculative matching
+    #########
+
+    def _schedule_prematch(self, torrent_id):
+        if not self._get_preference("speculative_matching"):
+            return
+        reactor.callLater(self._get_preference("speculative_delay"),
+                          self.prematch_lock.run, self._prematch, torrent_id)
+
+    @defer.inlineCallbacks
+    def _prematch(self, torrent_id):
+        """runs the auto sort rules and a test run on a downloading torrent and
+        stores the database and query filebot matched, so the run on the
+        finished torrent skips the lookup. Formats reading file content are
+        not prematched, the files are incomplete. Prematches run one at a
+        time."""
+        if torrent_id not in self.torrent_manager.torrents or not self.circuit.closed:
+            return
+        handler_name = filebottool.auto_sort.check_rules(
+            torrent_id, self.config["auto_sort_rules"], self._cached_media_info)
+        settings = self.config["saved_handlers"].get(handler_name) if handler_name else None
+        if not settings or self._reads_file_content(settings.get("format_string")):
+            return
+        handler = self._configure_filebot_handler(settings)
+        handler.job_id = torrent_id
+        rename_action = handler.rename_action
+        handler.rename_action = "test"
+        targets = self._get_filebot_target(torrent_id,
+                                           target_filter=settings.get("target_filter"))
+        # files not on disk yet would fail the test run
+        present = [t for t in targets if os.path.exists(t)]
+        groups = self._plan_rename_groups(handler, present) if present else []
+        if len(groups) != 1:
+            return
+        overrides, group_targets, memo_key = groups[0]
+        log.debug("speculatively matching torrent {0}".format(torrent_id))
+        match_info = {}
+        try:
+            yield self._rename_group(handler, group_targets, overrides, memo_key,
+                                     match_info, record_misses=False)
+        except pyfilebot.Error as err:
+            log.info("Speculative match failed for {0}: {1}".format(torrent_id, err))
+            return
+        handler.rename_action = rename_action
+        overrides = dict(overrides)
+        if (not handler.database and
+                match_info.get("database") in pyfilebot.FILEBOT_DATABASES):
+            overrides.setdefault("database", match_info["database"])
+        if len(match_info.get("queries", [])) == 1:
+            overrides.setdefault("query_override", match_info["queries"][0])
+        if not overrides.get("query_override"):
+            log.debug("nothing to pin for torrent {0}".format(torrent_id))
+            return
+        now = time.time()
+        for stale in [t for t, plan in self.prematched.items() if plan["expires"] < now]:
+            del self.prematched[stale]
+        self.prematched[torrent_id] = {
+            "key": filebottool.match_cache.make_key([], handler.get_settings()),
+            "targets": set(targets),
+            "overrides": overrides,
+            "expires": now + self._get_preference("prematch_ttl"),
+        }
+        log.info("Stored match for torrent {0}: {1}".format(torrent_id, overrides))
+
+    @staticmethod
+    def _reads_file_content(format_string):
+        """returns True if a format string uses bindings that read the files,
+        eg: {vf} or {crc32}"""
+        if not format_string:
+            return False
+        expressions = " ".join(re.findall(r"{([^{}]*)}", format_string))
+        return any(re.search(r"\b{0}\b".format(binding), expressions)
+                   for binding in CONTENT_BINDINGS)
+
+    def _take_prematch_plan(self, torrent_id, handler, targets):
+        """returns the rename overrides stored by _prematch for the given
+        targets, or None if there is no plan or it was made for other
+        targets or settings, or has expired."""
+        plan = self.prematched.pop(torrent_id, None)
+        if not plan or not targets:
+            return None
+        if (plan["key"] != filebottool.match_cache.make_key([], handler.get_settings())
+                or not plan["targets"].issuperset(targets)
+                or plan["expires"] < time.time()):
+            log.debug("stored plan for {0} is out of date".format(torrent_id))
+            return None
+        return plan["overrides"]
+
+    #########
+    #  Section: Incremental sorting
+    #########
+
+    def _start_incremental_sort(self, torrent_id):
+        """decides if a downloading torrent should be sorted file by file.
+        Only handlers with "incremental_sort" enabled and a rename action that
+        leaves the torrent's files in place qualify. Torrents that don't are
+        checked again on their next completed file, so new rules apply.
+        returns: the torrent's incremental sort state, or None
+        """
+        handler_name = filebottool.auto_sort.check_rules(
+            torrent_id, self.config["auto_sort_rules"], self._cached_media_info)
+        settings = self.config["saved_handlers"].get(handler_name) if handler_name else None
+        if (not settings or not settings.get("incremental_sort") or
+                settings.get("rename_action") not in INCREMENTAL_ACTIONS):
+            return None
+        log.info("Sorting torrent {0} incrementally with handler {1}".format(
+            torrent_id, handler_name))
+        state = {"handler_name": handler_name, "pending": set(), "placed": {},
+                 "timer": None, "running": None}
+        self.incremental_sorts[torrent_id] = state
+        return state
+
+    def _drop_incremental_sort(self, torrent_id):
+        """forgets the incremental sort state of a finished or removed
+        torrent"""
+        state = self.incremental_sorts.pop(torrent_id, None)
+        if state and state["timer"] and state["timer"].active():
+            state["timer"].cancel()
+
+    def _sort_completed_files(self, torrent_id):
+        """starts sorting the pending completed files of a torrent, unless a
+        batch is already running, which picks them up when it ends."""
+        state = self.incremental_sorts.get(torrent_id)
+        if not state or state["running"] or not self.circuit.closed:
+            return
+        running = self._sort_file_batches(torrent_id, state)
+        state["running"] = None if running.called else running
+
+    @defer.inlineCallbacks
+    def _sort_file_batches(self, torrent_id, state):
+        """renames completed files of a downloading torrent until none are
+        pending. Files that fail are left for the finished torrent's run."""
+        try:
+            while state["pending"]:
+                indexes, state["pending"] = state["pending"], set()
+                settings = self.config["saved_handlers"].get(state["handler_name"])
+                if not settings:
+                    return
+                handler = self._configure_filebot_handler(settings)
+                handler.job_id = torrent_id
+                torrent = self.torrent_manager[torrent_id]
+                save_path = torrent.get_status(["save_path"])["save_path"]
+                files = [f for f in torrent.get_files() if f["index"] in indexes]
+                files = self._filter_files(files, settings.get("target_filter"))
+                targets = [self._get_full_os_path(save_path, f["path"]) for f in files
+                           if self._get_full_os_path(save_path, f["path"])
+                           not in state["placed"]]
+                if not targets:
+                    continue
+                try:
+                    results = yield self._run_rename(
+                        handler, targets, lane=self._io_lane(torrent_id, handler))
+                except pyfilebot.Error:
+                    log.warning("Incremental sort failed for torrent {0}, leaving "
+                                "files for when it finishes.".format(torrent_id),
+                                exc_info=True)
+                    continue
+                log.info("Incrementally sorted: {0}".format(results[1]))
+                for old, new in results[1]:
+                    state["placed"][old] = new
+        finally:
+            state["running"] = None
+
+    @defer.inlineCallbacks
+    def _finish_incremental_sort(self, torrent_id):
+        """stops incremental sorting of a torrent, waiting for a running batch.
+        returns: dictionary of files already sorted in format {old: new}
+        """
+        state = self.incremental_sorts.pop(torrent_id, None)
+        if not state:
+            defer.returnValue({})
+        if state["timer"] and state["timer"].active():
+            state["timer"].cancel()
+        if state["running"]:
+            yield state["running"]
+        defer.returnValue(state["placed"])
 
     #########
     #  Section: Filebot interaction
@@ -353,6 +1018,289 @@ class Core(CorePluginBase):
 
         return conflicts
 
+    @defer.inlineCallbacks
+    def _run_rename(self, handler, targets, chunk_size=None, chunk_by=None,
+                    overrides=None, lane=None):
+        """runs handler.rename on targets in threads, one run per group from
+        _plan_rename_groups, and merges the results. Groups filebot could not
+        match only fail the run if every group failed.
+        Large groups are optionally split into chunks renamed in parallel,
+        see _split_chunks.
+        *overrides* renames all targets as one group with those rename
+        arguments instead, eg: a stored prematch.
+        *lane* is a SharedLane the filebot runs take, see _io_lane. It is
+        released once the runs are done.
+        """
+        if overrides:
+            groups = [(overrides, targets, None)]
+        else:
+            groups = self._plan_rename_groups(handler, targets)
+        try:
+            results = []
+            no_match = None
+            for overrides, group_targets, memo_key in groups:
+                chunks = self._split_chunks(group_targets, chunk_size, chunk_by)
+                try:
+                    if len(chunks) > 1:
+                        result = yield self._rename_chunks(handler, chunks, overrides,
+                                                           memo_key, lane)
+                    else:
+                        result = yield self._rename_group(handler, group_targets,
+                                                          overrides, memo_key,
+                                                          lane=lane)
+                except pyfilebot.FilebotNoMatchError as err:
+                    if len(groups) == 1:
+                        raise
+                    log.warning("FileBot could not match {0}".format(group_targets))
+                    no_match = err
+                    continue
+                results.append(result)
+            if not results and no_match:
+                raise no_match
+        finally:
+            if lane:
+                lane.release()
+        defer.returnValue(pyfilebot.merge_results(results))
+
+    def _io_lane(self, torrent_id, handler):
+        """returns a SharedLane in the I/O lane of the destination device (the
+        handler's output folder, or the torrent's save path if filebot
+        renames in place) for a step that copies a torrent's files or moves
+        them to another device. None if no file data is written."""
+        if handler.rename_action in LANE_FREE_ACTIONS:
+            return None
+        save_path = self.torrent_manager[torrent_id].get_status(
+            ["save_path"])["save_path"]
+        if handler.output:
+            destination = os.path.expanduser(os.path.expandvars(handler.output))
+        else:
+            destination = save_path
+        if (handler.rename_action not in DEDUP_ACTIONS and
+                filebottool.io_lanes.device_of(save_path) ==
+                filebottool.io_lanes.device_of(destination)):
+            return None  # moves within a filesystem are plain renames
+        return self.io_lanes.share(destination)
+
+    def _plan_rename_groups(self, handler, targets):
+        """splits targets into the filebot runs needed to rename them.
+
+        Unless the handler pins the database or query, targets are classified
+        by release name to pick a database and query per group, and shows
+        matched before get their remembered database and query. A query
+        naming a year is more specific than a remembered one and is kept.
+        returns: list of (rename overrides, targets, memo key or None)
+        """
+        if handler.query_override:
+            return [({}, targets, None)]
+        if self._get_preference("classify_releases") and not handler.database:
+            groups = [({"database": database, "query_override": query}, group)
+                      for database, query, group
+                      in filebottool.releases.group_by_database(targets)]
+        else:
+            groups = [({}, targets)]
+
+        planned = []
+        for overrides, group in groups:
+            memo_key = filebottool.match_cache.common_release_key(group)
+            remembered = self.match_memo.lookup(memo_key) if memo_key else None
+            if (remembered and handler.database in (None, remembered[0]) and
+                    not filebottool.match_cache.has_year(
+                        overrides.get("query_override"))):
+                log.debug("using remembered match {0} for '{1}'".format(
+                    remembered, memo_key))
+                overrides = {"database": remembered[0],
+                             "query_override": remembered[1]}
+            else:
+                memo_key = None
+            overrides = dict((k, v) for k, v in overrides.items() if v)
+            planned.append((overrides, group, memo_key))
+        log.debug("planned filebot runs: {0}".format(planned))
+        return planned
+
+    @staticmethod
+    def _split_chunks(targets, chunk_size=None, chunk_by=None):
+        """splits targets into chunks for parallel filebot runs.
+        Args:
+            targets: list of filebot targets
+            chunk_size: maximum number of files per chunk, None for no limit
+            chunk_by: "folder" to also split on parent folders
+        returns: list of target lists
+        """
+        if chunk_by == "folder":
+            folders = {}
+            for target in targets:
+                folders.setdefault(os.path.dirname(target), []).append(target)
+            chunks = [folders[f] for f in sorted(folders)]
+        else:
+            chunks = [targets]
+        if chunk_size:
+            chunks = [chunk[i:i + chunk_size] for chunk in chunks
+                      for i in range(0, len(chunk), chunk_size)]
+        return chunks
+
+    @defer.inlineCallbacks
+    def _rename_chunks(self, handler, chunks, overrides, memo_key, lane=None):
+        """renames the chunks of one group in parallel. The first chunk is
+        renamed on its own and the database and series it matched are pinned
+        for the rest, so every chunk matches the same show."""
+        match_info = {}
+        first = yield self._rename_group(handler, chunks[0], overrides, memo_key,
+                                         match_info, lane)
+        pinned = dict(overrides)
+        if (not handler.database and
+                match_info.get("database") in pyfilebot.FILEBOT_DATABASES):
+            pinned.setdefault("database", match_info["database"])
+        if len(match_info.get("queries", [])) == 1:
+            pinned.setdefault("query_override", match_info["queries"][0])
+        log.debug("renaming {0} more chunks with {1}".format(len(chunks) - 1, pinned))
+
+        semaphore = defer.DeferredSemaphore(self._get_preference("max_parallel_runs"))
+        outcomes = yield defer.DeferredList(
+            [semaphore.run(self._rename_group, handler, chunk, pinned, memo_key,
+                           lane=lane)
+             for chunk in chunks[1:]], consumeErrors=True)
+        results = [first]
+        for success, outcome in outcomes:
+            if success:
+                results.append(outcome)
+            elif outcome.check(pyfilebot.FilebotNoMatchError):
+                log.warning("FileBot could not match a chunk: {0}".format(
+                    outcome.value.msg))
+            else:
+                outcome.raiseException()
+        defer.returnValue(pyfilebot.merge_results(results))
+
+    @defer.inlineCallbacks
+    def _rename_group(self, handler, targets, overrides, memo_key, match_info=None,
+                      lane=None, record_misses=True):
+        """runs handler.rename on one group of targets in a thread. Fails
+        immediately if filebot recently could not match the same targets with
+        the same settings.
+        Args:
+            handler: the FilebotHandler to rename with
+            targets: list of filebot targets
+            overrides: rename arguments replacing the handler settings
+            memo_key: release key if the overrides are a remembered match
+            match_info: optional dictionary filled with what filebot matched
+            lane: optional SharedLane the filebot run waits for, see _io_lane
+            record_misses: False to keep a miss out of the negative cache,
+                eg: for speculative runs on files still downloading
+        """
+        settings = handler.get_settings()
+        settings.update(overrides)
+        key = filebottool.match_cache.make_key(targets, settings)
+        error = self.negative_cache.check(key)
+        if error:
+            log.info("Skipping FileBot run, targets were recently unmatchable.")
+            if handler.rename_action != "test":  # what the run would return
+                defer.returnValue((0, [], []))
+            raise pyfilebot.FilebotNoMatchError(
+                "FileBot could not match these files recently, skipping run.\n"
+                "{0}".format(error))
+        if match_info is None:
+            match_info = {}
+        try:
+            yield self.rate_limiter.acquire(
+                overrides.get("database", handler.database), handler.job_id)
+        except defer.CancelledError:
+            raise pyfilebot.FilebotCancelledError(
+                "Job {0} was cancelled.".format(handler.job_id))
+        run = lane.run if lane else defer.maybeDeferred
+        try:
+            results = yield run(threads.deferToThread, handler.rename, targets,
+                                match_info=match_info, **overrides)
+        except pyfilebot.FilebotNoMatchError as err:
+            # errors of the run itself (network, exceptions) are not cached
+            if record_misses and match_info.get("conclusive"):
+                self.negative_cache.record_failure(key, err.msg)
+                if memo_key:
+                    self.match_memo.forget(memo_key)
+            self._filebot_succeeded()
+            raise
+        except pyfilebot.FilebotLicenseError as err:
+            self.circuit.record_failure(filebottool.circuit.LICENSE, err.msg)
+            raise
+        except pyfilebot.FilebotFatalError as err:
+            self.circuit.record_failure(filebottool.circuit.FATAL, err.msg)
+            raise
+        self._filebot_succeeded()
+        if not results[0] and not results[1]:
+            if record_misses and match_info.get("conclusive"):
+                self.negative_cache.record_failure(key, "FileBot processed 0 files.")
+                if memo_key:
+                    self.match_memo.forget(memo_key)
+        else:
+            self.negative_cache.clear(key)
+            if not memo_key and handler.rename_action != "test":
+                self._learn_match(handler, targets, match_info)
+        defer.returnValue(results)
+
+    def _learn_match(self, handler, targets, match_info):
+        """remembers the database and query of a successful rename. Manual
+        query overrides are learned right away, matches filebot picked by
+        itself only once they repeat, see MatchMemo.observe"""
+        memo_key = filebottool.match_cache.common_release_key(targets)
+        if not memo_key:
+            return
+        database = handler.database or match_info.get("database")
+        if database not in pyfilebot.FILEBOT_DATABASES:
+            database = None
+        if handler.query_override:
+            self.match_memo.learn(memo_key, database, handler.query_override)
+        elif len(match_info.get("queries", [])) == 1:
+            self.match_memo.observe(memo_key, database, match_info["queries"][0])
+
+    @defer.inlineCallbacks
+    def _dedup_targets(self, handler, targets, fingerprints):
+        """links or skips targets whose content is already in the library
+        instead of letting filebot copy them again.
+        Args:
+            handler: the handler the torrent is being renamed with
+            targets: list of filebot targets
+            fingerprints: dictionary from dedup.fingerprint_files
+        returns: list of (old, new) tuples for the targets that were handled
+        """
+        duplicates = {}
+        for target in targets:
+            fingerprint = fingerprints.get(target)
+            existing = self.dedup_index.lookup(fingerprint) if fingerprint else None
+            if existing:
+                duplicates[target] = existing
+        if not duplicates:
+            defer.returnValue([])
+
+        log.debug("already imported content found for: {0}".format(duplicates))
+        try:
+            plan = yield threads.deferToThread(handler.rename, list(duplicates),
+                                               rename_action="test")
+        except pyfilebot.Error:
+            log.warning("Could not plan destinations for duplicates, "
+                        "copying normally.", exc_info=True)
+            defer.returnValue([])
+
+        handled = []
+        for old, new in plan[1]:
+            if old not in duplicates:
+                continue
+            new = os.path.abspath(os.path.join(os.path.dirname(old), new))
+            result = yield threads.deferToThread(filebottool.dedup.link_existing,
+                                                 old, duplicates[old], new)
+            if result:
+                log.info("{0} {1} from {2}".format(result, new, duplicates[old]))
+                handled.append((old, new))
+        defer.returnValue(handled)
+
+    def _index_library_files(self, filebot_moves, fingerprints):
+        """records the new locations of fingerprinted files in the dedup
+        index"""
+        for old, new in filebot_moves:
+            fingerprint = fingerprints.get(old)
+            if not fingerprint:
+                continue
+            new = os.path.abspath(os.path.join(os.path.dirname(old), new))
+            self.dedup_index.add(fingerprint, new)
+        self.dedup_index.save()
+
     @defer.inlineCallbacks
     def _rollback(self, filebot_movements, torrent_id):
         targets = [pair[1] for pair in filebot_movements[1]]
@@ -370,21 +1318,123 @@ class Core(CorePluginBase):
     #  Section: Utilities
     #########
 
-    def _get_filebot_target(self, torrent_id):
+    def _get_filebot_target(self, torrent_id, collapse=False, target_filter=None):
         """returns the path of the file or folder that filebot should target
-        Args: torrent_id: torrent_id
+        Args:
+            torrent_id: torrent_id
+            collapse: target the torrent's top folder instead of its files
+                when every file is selected, there are at least
+                collapse_target_threshold of them and the folder holds no
+                other files filebot could move.
+            target_filter: optional handler target filter, see _filter_files
         returns: path
         """
         log.debug("targets list for torrent {0}".format(torrent_id))
         torrent = self.torrent_manager[torrent_id]
         save_path = torrent.get_status(["save_path"])["save_path"]
-        targets = [self._get_full_os_path(save_path, f["path"]) for f in
-                   torrent.get_files()]
+        files = torrent.get_files()
         priorities = torrent.options["file_priorities"]
-        targets = [t for t, p in zip(targets, priorities) if p != 0]
+        selected = [f for f, p in zip(files, priorities) if p != 0]
+        candidates = self._filter_files(selected, target_filter)
+        threshold = self._get_preference("collapse_target_threshold")
+        if (collapse and threshold and len(files) >= threshold and
+                len(candidates) == len(files)):
+            top_levels = set(f["path"].split("/")[0] for f in files)
+            target = None
+            if len(top_levels) == 1 and all("/" in f["path"] for f in files):
+                target = self._get_full_os_path(save_path, top_levels.pop())
+            own_files = set(self._get_full_os_path(save_path, f["path"])
+                            for f in files)
+            if target and self._folder_files(target) <= own_files:
+                log.debug("all files selected, targeting folder {0}".format(target))
+                return [target]
+        targets = [self._get_full_os_path(save_path, f["path"]) for f in candidates]
         log.debug("targets found: {0}".format(targets))
         return targets
 
+    @staticmethod
+    def _folder_files(folder):
+        """returns the paths of every file under *folder*"""
+        return set(os.path.join(root, name)
+                   for root, _, names in os.walk(folder) for name in names)
+
+    @staticmethod
+    def _filter_files(files, target_filter):
+        """drops files that should not be sent to filebot.
+        Args:
+            files: list of deluge file dictionaries
+            target_filter: dictionary with any of the keys:
+                "allow_extensions": only keep these extensions, eg ["mkv"]
+                "deny_extensions": drop these extensions, eg ["nfo", "txt"]
+                "min_size": drop files smaller than this many bytes
+                "exclude_patterns": drop paths matching any of these regexes,
+                    eg ["(?i)(^|/)sample/"]
+        returns: the files filebot should target
+        """
+        if not target_filter:
+            return files
+        allow = set(e.lower().lstrip(".") for e in
+                    target_filter.get("allow_extensions") or [])
+        deny = set(e.lower().lstrip(".") for e in
+                   target_filter.get("deny_extensions") or [])
+        min_size = target_filter.get("min_size") or 0
+        patterns = [re.compile(p) for p in target_filter.get("exclude_patterns") or []]
+
+        kept = []
+        for f in files:
+            extension = os.path.splitext(f["path"])[1].lower().lstrip(".")
+            if allow and extension not in allow:
+                continue
+            if extension in deny or f["size"] < min_size:
+                continue
+            if any(p.search(f["path"]) for p in patterns):
+                continue
+            kept.append(f)
+        log.debug("target filter dropped {0} of {1} files".format(
+            len(files) - len(kept), len(files)))
+        return kept
+
+    def _add_companion_moves(self, torrent_id, deluge_movements, target_filter):
+        """moves files the target filter kept from filebot along with the
+        media file they belong to (eg "Movie.nfo" or "Movie.en.srt" along with
+        "Movie.mkv").
+        Args:
+            torrent_id
+            deluge_movements: a tuple from _translate_filebot_movements
+            target_filter: the handler target filter
+        returns: deluge_movements including the companion moves
+        """
+        if not deluge_movements or not target_filter:
+            return deluge_movements
+        new_save_path, new_top_lvl, new_file_paths = deluge_movements
+        torrent = self.torrent_manager[torrent_id]
+        files = torrent.get_files()
+        priorities = torrent.options["file_priorities"]
+        selected = [f for f, p in zip(files, priorities) if p != 0]
+        kept = set(f["index"] for f in self._filter_files(selected, target_filter))
+        paths = dict((f["index"], f["path"]) for f in files)
+        save_path = new_save_path or torrent.get_status(["save_path"])["save_path"]
+
+        companion_moves = []
+        for f in selected:
+            if f["index"] in kept:
+                continue
+            folder, name = os.path.split(f["path"])
+            for index, new_path in new_file_paths:
+                media_folder, media_name = os.path.split(paths[index])
+                stem = os.path.splitext(media_name)[0]
+                if media_folder != folder or not name.startswith(stem + "."):
+                    continue
+                new_stem = os.path.splitext(new_path)[0]
+                companion = new_stem + name[len(stem):]
+                if os.path.exists(self._get_full_os_path(save_path, companion)):
+                    break
+                log.debug("moving {0} along with its media to {1}".format(
+                    f["path"], companion))
+                companion_moves.append((f["index"], companion))
+                break
+        return new_save_path, new_top_lvl, new_file_paths + companion_moves
+
     @staticmethod
     def _get_full_os_path(save_path, deluge_path):
         """given a save path and a deluge file path, return the actual os
@@ -422,7 +1472,10 @@ class Core(CorePluginBase):
             "on_conflict",
             "query_override",
             "non_strict",
-            "mode"
+            "mode",
+            "launch_profile",
+            "timeout",
+            "resource_policy",
         ]
         for attribute in valid_handler_attributes:
             if attribute in settings:
@@ -484,19 +1537,166 @@ class Core(CorePluginBase):
 
         return True
 
+    def _configure_pyfilebot(self):
+        """applies the plugin preferences that configure pyfilebot"""
+        if self._get_preference("isolated_workers"):
+            pyfilebot.WORKER_DATA_ROOT = os.path.join(
+                deluge.configmanager.get_config_dir(), "filebottool_workers")
+        else:
+            pyfilebot.WORKER_DATA_ROOT = None
+        pyfilebot.CACHE_MERGE_INTERVAL = self._get_preference("cache_merge_interval")
+        pyfilebot.LAUNCH_PROFILES = self._get_preference("launch_profiles")
+        pyfilebot.LAUNCH_DATA_DIR = os.path.join(
+            deluge.configmanager.get_config_dir(), "filebottool_jvm")
+        pyfilebot.DEFAULT_TIMEOUT = self._get_preference("filebot_timeout")
+        pyfilebot.RESOURCE_POLICIES = self._get_preference("resource_policies")
+        pyfilebot.CGROUP_ROOT = self._get_preference("cgroup_root")
+        pyfilebot.reset_cgroups()
+
+    def _get_preference(self, name):
+        """returns a plugin preference, falling back to its default"""
+        return self.config["plugin_preferences"].get(
+            name, DEFAULT_PLUGIN_PREFERENCES[name])
+
     def _mark_processing(self, torrent_id, handler_name=None):
         "Notes a torrent as being processed by FileBotTool"
         log.debug("Marking torrent {0} as processing.".format(torrent_id))
         if torrent_id in self.processing_torrents:
             log.debug("Torrent {0} already marked as in progress.".format(torrent_id))
             if handler_name:
-                self.processing_torrents["handler_name"] = handler_name
-                return
+                self.processing_torrents[torrent_id]["handler_name"] = handler_name
+            return
         info = {}
         info["state"] = self.torrent_manager[torrent_id].state
         info["handler_name"] = handler_name
         self.processing_torrents[torrent_id] = info
 
+    @staticmethod
+    def _subtitle_languages(languages):
+        """returns a list of language codes from a code, a comma separated
+        string of codes or a list"""
+        if not languages:
+            return [None]
+        if isinstance(languages, six.string_types):
+            languages = languages.split(",")
+        return [l.strip() for l in languages if l.strip()] or [None]
+
+    def _queue_subtitles(self, torrent_id, handler_name, languages, encoding=None,
+                         targets=None):
+        """queues a torrent for background subtitle downloads. *targets* None
+        uses the torrent's files once it has finished processing."""
+        self.subtitle_queue.append({
+            "torrent_id": torrent_id,
+            "handler_name": handler_name,
+            "languages": self._subtitle_languages(languages),
+            "encoding": encoding,
+            "targets": targets,
+        })
+        self._schedule_subtitle_queue()
+
+    def _schedule_subtitle_queue(self):
+        if self.subtitle_timer and self.subtitle_timer.active():
+            return
+        self.subtitle_timer = reactor.callLater(
+            self._get_preference("subtitle_batch_delay"), self._process_subtitle_queue)
+
+    @defer.inlineCallbacks
+    def _process_subtitle_queue(self):
+        """gets subtitles for every queued torrent that finished processing,
+        one filebot run per batch of files sharing languages and encoding.
+        Torrents still processing stay queued until _finish_processing."""
+        self.subtitle_timer = None
+        if not self.circuit.closed:
+            self._schedule_subtitle_queue()
+            return
+        ready = [e for e in self.subtitle_queue
+                 if e["torrent_id"] not in self.processing_torrents]
+        self.subtitle_queue = [e for e in self.subtitle_queue
+                               if e["torrent_id"] in self.processing_torrents]
+        batches = {}
+        for entry in ready:
+            targets = entry["targets"]
+            if targets is None:
+                try:
+                    targets = self._get_filebot_target(entry["torrent_id"])
+                except KeyError:  # torrent was removed
+                    continue
+            key = (tuple(entry["languages"]), entry["encoding"])
+            batches.setdefault(key, []).extend(
+                (entry, target) for target in targets)
+
+        batch_size = self._get_preference("subtitle_batch_size")
+        for (languages, encoding), items in batches.items():
+            for chunk in self._split_chunks(items, batch_size):
+                yield self._fetch_subtitles(chunk, languages, encoding)
+        self.subtitle_cache.save()
+
+    @defer.inlineCallbacks
+    def _fetch_subtitles(self, chunk, languages, encoding):
+        """gets subtitles for a chunk of (entry, target) items, skipping the
+        files and languages the subtitle cache already knows about"""
+        hashes = yield threads.deferToThread(filebottool.subtitle_cache.hash_files,
+                                             [target for _, target in chunk])
+        needed = {}
+        for item in chunk:
+            file_hash = hashes.get(item[1])
+            missing = tuple(l for l in languages if file_hash is None or
+                            self.subtitle_cache.needs_lookup(file_hash, l))
+            needed.setdefault(missing, []).append(item)
+
+        skipped = needed.pop((), [])
+        if skipped:
+            log.debug("subtitle cache skipped {0} files".format(len(skipped)))
+            self._report_subtitles(skipped, [])
+        for missing, items in needed.items():
+            targets = [target for _, target in items]
+            log.debug("getting {0} subtitles for {1} files".format(
+                missing, len(targets)))
+            try:
+                if missing[0] is None:  # filebot's default language
+                    subs = yield threads.deferToThread(
+                        pyfilebot.get_subtitles, targets, encoding=encoding)
+                    by_language = {None: subs}
+                else:
+                    by_language = yield threads.deferToThread(
+                        pyfilebot.get_subtitles_by_language, targets, list(missing),
+                        encoding)
+            except pyfilebot.Error as err:
+                log.error("FILEBOT ERROR while getting subs!", exc_info=True)
+                self._report_subtitles(items, error=err)
+                continue
+            for target in targets:
+                if target not in hashes:
+                    continue
+                stem = os.path.splitext(target)[0] + "."
+                for language, subs in by_language.items():
+                    self.subtitle_cache.record(
+                        hashes[target], language,
+                        [sub for sub in subs if sub.startswith(stem)])
+            subs = [sub for language in missing for sub in by_language.get(language, [])]
+            log.info("Downloaded subs: {0}".format(subs))
+            self._report_subtitles(items, subs)
+
+    def _report_subtitles(self, chunk, subs=None, error=None):
+        """emits subtitle events for each torrent in a batch"""
+        entries = []
+        for entry, _ in chunk:
+            if not any(e is entry for e in entries):
+                entries.append(entry)
+        for entry in entries:
+            torrent_id, handler_name = entry["torrent_id"], entry["handler_name"]
+            if error:
+                self.event_manager.emit(events.FileBotToolSubtitlesErrorEvent(
+                    torrent_id, handler_name, error))
+                continue
+            stems = tuple(os.path.splitext(target)[0] + "."
+                          for e, target in chunk if e is entry)
+            owned = [sub for sub in subs if sub.startswith(stems)]
+            if not owned:
+                log.info("No subs found for torrent {0}".format(torrent_id))
+            self.event_manager.emit(events.FileBotToolSubtitlesDownloadedEvent(
+                torrent_id, handler_name, owned))
+
     def _finish_processing(self, torrent_id, error=False):
         "Marks a torrent as done"
         log.debug("Finished processing torrent {0}".format(torrent_id))
@@ -510,6 +1710,11 @@ class Core(CorePluginBase):
             self.torrent_manager[torrent_id].resume()
         h_name = info["handler_name"]
         del self.processing_torrents[torrent_id]
+        self._drop_incremental_sort(torrent_id)
+        if any(e["torrent_id"] == torrent_id for e in self.subtitle_queue):
+            self._schedule_subtitle_queue()
+        pyfilebot.clear_job(torrent_id)
+        self._drop_job(torrent_id)
         if error:
             event = events.FileBotToolProcessingErrorEvent(torrent_id, h_name, error)
             self.event_manager.emit(event)
@@ -527,8 +1732,98 @@ class Core(CorePluginBase):
         for key in config.keys():
             self.config[key] = config[key]
         self.config.save()
+        self.negative_cache.ttl = self._get_preference("no_match_cache_ttl")
+        self.negative_cache.max_ttl = self._get_preference("no_match_cache_max_ttl")
+        self.negative_cache.invalidate()
+        self.match_memo.confirmations = self._get_preference("match_memo_confirmations")
+        self._configure_warmup_policy()
+        self.warmup_rule_matches.clear()
+        self._configure_pyfilebot()
+        self.circuit.cooldown = self._get_preference("circuit_cooldown")
+        self.rate_limiter.configure(self._get_preference("database_rate_limits"))
+        self.io_lanes.per_device = self._get_preference("io_lane_concurrency")
+        self.subtitle_cache.ttl = self._get_preference("subtitle_cache_ttl")
         log.debug("config saved")
 
+    @export
+    def get_parked_jobs(self):
+        """returns the auto sorts waiting for their schedule window"""
+        return list(self.job_store["parked"])
+
+    @export
+    def get_io_lane_status(self):
+        """returns the running and queued file moves per destination device"""
+        return self.io_lanes.get_status()
+
+    @export
+    def get_rate_limit_status(self):
+        """returns the tokens left and queued runs of every rate limited
+        database"""
+        return self.rate_limiter.get_status()
+
+    @export
+    def get_circuit_status(self):
+        """returns the state of the FileBot circuit breaker and the torrents
+        held until it closes"""
+        status = self.circuit.get_status()
+        status["held_torrents"] = list(self.circuit_queue)
+        return status
+
+    @export
+    def cancel_job(self, torrent_id):
+        """aborts FileBotTool's work on a torrent. Running filebot runs are
+        killed and queued ones dropped. A torrent being processed finishes
+        with a FileBotToolProcessingErrorEvent.
+        returns: True if there was anything to cancel"""
+        cancelled = False
+        if torrent_id in self.processing_torrents:
+            killed = pyfilebot.cancel_job(torrent_id)
+            log.info("Cancelled processing of torrent {0}, killed {1} FileBot "
+                     "runs.".format(torrent_id, killed))
+            cancelled = True
+        elif pyfilebot.job_running(torrent_id):  # background work
+            pyfilebot.cancel_job(torrent_id)
+            pyfilebot.clear_job(torrent_id)
+            log.info("Cancelled background FileBot runs for {0}".format(torrent_id))
+            cancelled = True
+        if self.rate_limiter.cancel_job(torrent_id):
+            cancelled = True
+        queued = [e for e in self.subtitle_queue if e["torrent_id"] == torrent_id]
+        if queued:
+            self.subtitle_queue = [e for e in self.subtitle_queue
+                                   if e["torrent_id"] != torrent_id]
+            cancelled = True
+        state = self.incremental_sorts.get(torrent_id)
+        if state and state["timer"] and state["timer"].active():
+            state["timer"].cancel()
+            cancelled = True
+        if self.prematched.pop(torrent_id, None):
+            cancelled = True
+        if torrent_id in self.circuit_queue:  # held until filebot recovers
+            self.circuit_queue.remove(torrent_id)
+            self._drop_job(torrent_id)
+            cancelled = True
+        parked = self.job_store["parked"]
+        if any(job["torrent_id"] == torrent_id for job in parked):
+            self.job_store["parked"] = [job for job in parked
+                                        if job["torrent_id"] != torrent_id]
+            self.job_store.save()
+            cancelled = True
+        return cancelled
+
+    @export
+    @defer.inlineCallbacks
+    def get_media_info(self, torrent_id):
+        """returns the media info of a torrent's video files, probing files that
+        are not cached yet.
+        returns result in format (Success, {path: info})"""
+        try:
+            info = yield self._probe_media(torrent_id)
+        except pyfilebot.Error as err:
+            log.error("FILEBOT ERROR: {0}".format(str(err)), exc_info=True)
+            defer.returnValue((False, str(err)))
+        defer.returnValue((True, info))
+
     @export
     def get_filebot_version(self):
         if not self.filebot_version:
@@ -558,13 +1853,24 @@ class Core(CorePluginBase):
             else:
                 handler = pyfilebot.FilebotHandler()
 
+        if not self.circuit.allow():
+            err = self.circuit.error()
+            defer.returnValue(((False, {torrent_id: (err.__class__.__name__, err.msg)}),
+                               ('FILEBOTERROR', None)))
         handler.rename_action = "test"
-        target = self._get_filebot_target(torrent_id)
+        handler.job_id = torrent_id
+        handler_settings = handler_settings or {}
+        target_filter = handler_settings.get("target_filter")
+        chunk_size = handler_settings.get("chunk_size")
+        chunk_by = handler_settings.get("chunk_by")
+        target = self._get_filebot_target(
+            torrent_id, collapse=not (chunk_size or chunk_by),
+            target_filter=target_filter)
         log.debug("running filbot dry run for torrent: {0} with target {1}".format(
             torrent_id, target))
         try:
-            filebot_results = yield threads.deferToThread(handler.rename,
-                                                          target)
+            filebot_results = yield self._run_rename(handler, target, chunk_size,
+                                                     chunk_by)
         except pyfilebot.FilebotRuntimeError as err:
             log.error("FILEBOT ERROR!", exc_info=True)
             defer.returnValue(((False, {torrent_id:('FilebotRuntimeError', err.msg)}),
@@ -577,6 +1883,8 @@ class Core(CorePluginBase):
         log.debug("recieved results from filebot: {0}".format(filebot_results))
         deluge_movements = self._translate_filebot_movements(torrent_id,
                                                              filebot_results[1])
+        deluge_movements = self._add_companion_moves(torrent_id, deluge_movements,
+                                                     target_filter)
         if not deluge_movements:
             new_save_path = self.torrent_manager[torrent_id].get_status(
                 ["save_path"])["save_path"]
@@ -627,25 +1935,72 @@ class Core(CorePluginBase):
             else:
                 handler = pyfilebot.FilebotHandler()
                 handler_name = None
+        handler_settings = handler_settings or {}
+        target_filter = handler_settings.get("target_filter")
+        chunk_size = handler_settings.get("chunk_size")
+        chunk_by = handler_settings.get("chunk_by")
+        # fingerprinting and chunking need the individual files
+        collapse = not (self._get_preference("dedup_enabled") or chunk_size or chunk_by)
 
         errors = {}
         new_files = []
         for torrent_id in torrent_ids:
             self._mark_processing(torrent_id, handler_name)
+            granted = torrent_id in self.circuit_granted
+            self.circuit_granted.discard(torrent_id)
+            if not (granted or self.circuit.allow()):
+                err = self.circuit.error()
+                log.error("Not renaming torrent {0}: {1}".format(torrent_id, err.msg))
+                errors[torrent_id] = (err.__class__.__name__, err.msg)
+                self._finish_processing(torrent_id, error=err.msg)
+                continue
+            handler.job_id = torrent_id
             if handler.rename_action is not None:
                 link = "link" in handler.rename_action or handler.rename_action == 'copy'
             else:
                 link = False
-            target = self._get_filebot_target(torrent_id)
+            placed = yield self._finish_incremental_sort(torrent_id)
+            prematched = torrent_id in self.prematched
+            target = self._get_filebot_target(
+                torrent_id, collapse=collapse and not placed and not prematched,
+                target_filter=target_filter)
+            # files already sorted while the torrent was downloading
+            handled_moves = [(old, placed[old]) for old in target if old in placed]
+            target = [t for t in target if t not in placed]
             log.debug("beginning filebot run on torrent {0}, with target {1}".format(
                 torrent_id, target))
+            if handler_settings and handler.rename_action != "test":
+                info = self.processing_torrents[torrent_id]
+                self._save_job(
+                    torrent_id, JOB_RENAMING, handler_settings=handler_settings,
+                    state=info["state"], handler_name=info["handler_name"],
+                    files=[f for f in self._get_filebot_target(torrent_id)
+                           if os.path.exists(f)])
 
             if not link:
                 self.torrent_manager[torrent_id].pause()
 
+            fingerprints = None
+            if self._get_preference("dedup_enabled"):
+                fingerprints = yield threads.deferToThread(
+                    filebottool.dedup.fingerprint_files, target)
+                if handler.rename_action in DEDUP_ACTIONS:
+                    deduped = yield self._dedup_targets(handler, target, fingerprints)
+                    handled = set(old for old, _ in deduped)
+                    target = [t for t in target if t not in handled]
+                    handled_moves += deduped
+
+            plan = self._take_prematch_plan(torrent_id, handler, target)
+            if plan:
+                log.info("Using stored match {0} for torrent {1}".format(
+                    plan, torrent_id))
             try:
-                filebot_results = yield threads.deferToThread(handler.rename,
-                                                              target)
+                if target:
+                    filebot_results = yield self._run_rename(
+                        handler, target, chunk_size, chunk_by, plan,
+                        lane=self._io_lane(torrent_id, handler))
+                else:
+                    filebot_results = (0, [], [])
             except pyfilebot.FilebotRuntimeError as err:
                 log.error("FILEBOT ERROR!", exc_info=True)
                 errors[torrent_id] = (str(err.__class__.__name__), err.msg)
@@ -658,19 +2013,28 @@ class Core(CorePluginBase):
                 filebot_results = ["", {}, {}]
                 self._finish_processing(torrent_id, error=err)
                 continue
-            except Exception as e:
+            except Exception as err:
                 log.error("Unexpected error from pyfilebot.", exc_info=True)
-                errors[torrent_id] = (str(err.__class__.__name__), err.msg)
+                errors[torrent_id] = (str(err.__class__.__name__),
+                                      getattr(err, "msg", str(err)))
                 filebot_results = ["", {}, {}]
                 self._finish_processing(torrent_id, error=err)
                 continue
 
             log.debug("recieved results from filebot: {0}".format(
                 filebot_results))
+            if handled_moves:
+                filebot_results = (filebot_results[0] + len(handled_moves),
+                                   filebot_results[1] + handled_moves,
+                                   filebot_results[2])
+            if fingerprints:
+                self._index_library_files(filebot_results[1], fingerprints)
 
             if not link:
                 deluge_movements = self._translate_filebot_movements(torrent_id,
                                                                      filebot_results[1])
+                deluge_movements = self._add_companion_moves(
+                    torrent_id, deluge_movements, target_filter)
             else:
                 deluge_movements = None
                 new_files += filebot_results[1]
@@ -697,33 +2061,21 @@ class Core(CorePluginBase):
             if deluge_movements:
                 log.debug("Attempting to re-reoute torrent: {0}".format(
                     deluge_movements))
+                if torrent_id in self.job_store["jobs"]:
+                    self._save_job(torrent_id, JOB_RELOCATING,
+                                   movements=deluge_movements)
                 self._redirect_torrent_paths(torrent_id, deluge_movements)
 
-            #  download subs
-            if handler_settings:
-                if handler_settings['download_subs']:
-                    handler.output = None
-                    if link:
-                        deluge_movements = self._translate_filebot_movements(torrent_id, filebot_results[1])
-
-                    mock = self._get_mockup_files_dictionary(torrent_id, deluge_movements)
-                    new_save = deluge_movements[0] if deluge_movements else None
-                    if not new_save:
-                        torrent = self.torrent_manager[torrent_id]
-                        new_save = torrent.get_status(["save_path"])["save_path"]
-
-                    target = [self._get_full_os_path(new_save, f['path']) for f in mock]
-                    try:
-                        subs = yield threads.deferToThread(handler.get_subtitles,
-                            target, language_code=handler_settings['subs_language'])
-                        if not subs:
-                            log.info("No subs found for torrent {0}".format(torrent_id))
-                        else:
-                            log.info('Downloaded subs: {0}'.format(subs))
-                            new_files += subs
-                    except pyfilebot.FilebotRuntimeError as err:
-                        log.error("FILEBOT ERROR while getting subs!", exc_info=True)
-                        errors[torrent_id] = (str(err), err.msg)
+            #  download subs once the torrent is finished
+            if handler_settings.get("download_subs"):
+                sub_targets = None
+                if link:
+                    sub_targets = [
+                        os.path.abspath(os.path.join(os.path.dirname(old), new))
+                        for old, new in filebot_results[1]]
+                self._queue_subtitles(torrent_id, handler_name,
+                                      handler_settings.get("subs_language"),
+                                      handler.encoding, sub_targets)
 
             if not deluge_movements:
                 self._finish_processing(torrent_id)
@@ -737,29 +2089,51 @@ class Core(CorePluginBase):
     @export
     @defer.inlineCallbacks
     def do_revert(self, torrent_ids):
-        """calls filebottool.revert() on files in a torrent. Will only allow
-        one torrent at a time"""
+        """calls filebottool.revert() on the files of the given torrents, using
+        a single filebot run for all of them"""
         errors = {}
         if isinstance(torrent_ids, str):
             torrent_ids = [torrent_ids]
+        target_groups = {}
         for torrent_id in torrent_ids:
             self._mark_processing(torrent_id)
-            targets = self._get_filebot_target(torrent_id)
-            log.debug("reverting torrent {0} with targets {1}".format(torrent_id,
-                                                                    targets))
+            target_groups[torrent_id] = self._get_filebot_target(torrent_id)
+            log.debug("reverting torrent {0} with targets {1}".format(
+                torrent_id, target_groups[torrent_id]))
             self.torrent_manager[torrent_id].pause()
-            handler = pyfilebot.FilebotHandler()
-            try:
-                # noinspection PyUnresolvedReferences
-                filebot_results = yield threads.deferToThread(handler.revert,
-                                                              targets)
-            except Exception as err:
-                log.error("FILEBOT ERROR!", exc_info=True)
-                errors[torrent_id] = (str(err), err.msg)
-                self._finish_processing(torrent_id, error=err)
-                continue
+        handler = pyfilebot.FilebotHandler(job_id=tuple(torrent_ids))
+        try:
+            # noinspection PyUnresolvedReferences
+            bulk_results = yield threads.deferToThread(handler.revert_bulk,
+                                                       target_groups)
+        except Exception as err:
+            log.error("FILEBOT ERROR!", exc_info=True)
+            if len(torrent_ids) < 2 or isinstance(err, (
+                    pyfilebot.FilebotCancelledError, pyfilebot.FilebotFatalError,
+                    pyfilebot.FilebotLicenseError)):
+                for torrent_id in torrent_ids:
+                    errors[torrent_id] = (str(err), getattr(err, "msg", str(err)))
+                    self._finish_processing(torrent_id, error=err)
+                defer.returnValue((False, errors))
+            # one bad torrent fails the whole run, revert them one at a time
+            log.info("Bulk revert failed, reverting torrents one at a time.")
+            bulk_results = {}
+            for torrent_id in torrent_ids:
+                handler = pyfilebot.FilebotHandler(job_id=torrent_id)
+                try:
+                    # noinspection PyUnresolvedReferences
+                    bulk_results[torrent_id] = yield threads.deferToThread(
+                        handler.revert, target_groups[torrent_id])
+                except Exception as err:
+                    log.error("FILEBOT ERROR reverting {0}".format(torrent_id),
+                              exc_info=True)
+                    errors[torrent_id] = (str(err), getattr(err, "msg", str(err)))
+                    self._finish_processing(torrent_id, error=err)
 
-            # noinspection PyUnboundLocalVariable
+        for torrent_id in torrent_ids:
+            if torrent_id not in bulk_results:
+                continue
+            filebot_results = bulk_results[torrent_id]
             deluge_movements = self._translate_filebot_movements(torrent_id,
                                                                  filebot_results[1])
 
@@ -803,17 +2177,42 @@ class Core(CorePluginBase):
         except Exception as err:
             log.error("FILEBOT ERROR: {0}".format(str(err)), exc_info=True)
             defer.returnValue((False, err))
+        defer.returnValue((True, self._history_structure(torrent_id, history)))
+
+    @export
+    @defer.inlineCallbacks
+    def get_filebot_history_bulk(self, torrent_ids):
+        """returns the filebot history of several torrents using a single
+        filebot run.
+        returns result in format (Success, {torrent_id: (prev_save_path, files)})
+        """
+        log.debug("getting history of torrents {0}".format(torrent_ids))
+        target_groups = dict((torrent_id, self._get_filebot_target(torrent_id))
+                             for torrent_id in torrent_ids)
+        try:
+            history = yield threads.deferToThread(pyfilebot.get_history_bulk,
+                                                  target_groups)
+        except Exception as err:
+            log.error("FILEBOT ERROR: {0}".format(str(err)), exc_info=True)
+            defer.returnValue((False, err))
+        defer.returnValue((True, dict(
+            (torrent_id, self._history_structure(torrent_id, history[torrent_id]))
+            for torrent_id in torrent_ids)))
+
+    def _history_structure(self, torrent_id, history):
+        """converts filebot history into (prev_save_path, files) for a torrent,
+        or (None, None) if it has no history"""
         movements = self._translate_filebot_movements(torrent_id, history)
         if not movements:
             log.debug("No history found for {0}".format(torrent_id))
-            defer.returnValue((True, (None, None)))
+            return None, None
 
         prev_path = movements[0]
         if not prev_path:
             prev_path = self.torrent_manager[torrent_id].get_status(
                 ["save_path"])["save_path"]
         mock_files = self._get_mockup_files_dictionary(torrent_id, movements)
-        defer.returnValue((True, (prev_path, mock_files)))
+        return prev_path, mock_files
 
 
 
@@ -883,7 +2282,14 @@ class Core(CorePluginBase):
         log.debug("Updating saved handlers: {}".format(handlers))
         self.config["saved_handlers"] = handlers
         self.config.save()
+        self.negative_cache.invalidate()
+
 
+    @export
+    def get_warmup_stats(self):
+        """returns the predictive warm-up statistics, in format
+        {"warmups", "hits", "misses", "wasted", "hit_rate", "last_warmup"}"""
+        return self.warmup_policy.get_stats()
 
     @export
     def get_plugin_version(self):
@@ -906,6 +2312,14 @@ class Core(CorePluginBase):
         except Exception as err:
             log.error("FILEBOT ERROR: {0}".format(str(err)), exc_info=True)
             defer.returnValue('ERROR COMMUNICATING WITH FILEBOT!\n' + str(err))
+        info += "\nStartup time by launch profile:\n"
+        for profile in sorted(pyfilebot.LAUNCH_PROFILES):
+            try:
+                elapsed = yield threads.deferToThread(pyfilebot.startup_time, profile)
+            except pyfilebot.Error as err:
+                info += "    {0}: failed ({1})\n".format(profile, err)
+            else:
+                info += "    {0}: {1:.2f}s\n".format(profile, elapsed)
         log.debug("FileBot debug info retrieved.")
         defer.returnValue(info)
 
@@ -924,6 +2338,8 @@ class Core(CorePluginBase):
             result = "{0}: {1}".format(error.__class__.__name__, error.message)
         else:
             log.debug("Filebot Successufully licensed.")
+            if self.circuit.kind == filebottool.circuit.LICENSE:
+                self._filebot_succeeded()
         finally:
             os.unlink(license_file.name)
             del license_file
@@ -0,0 +1,53 @@
+// FileBotTool rename script.
+// Renames the given files using the global filebot options (--format, --db,
+// --action, --conflict, --output, --q, --order, --lang, -non-strict) and logs
+// one JSON object per event, each on its own line:
+//   {"event": "move", "from": "...", "to": "..."}
+//   {"event": "skip", "file": "...", "reason": "..."}
+//   {"event": "error", "message": "..."}
+//   {"event": "summary", "processed": N}
+// No events are logged for test runs, their plain log lines are parsed.
+import groovy.json.JsonOutput
+import java.util.logging.Handler
+import java.util.logging.LogRecord
+
+def emit(Map event) {
+    log.info(JsonOutput.toJson(event))
+}
+
+def skipped = []
+def skipWatcher = new Handler() {
+    void publish(LogRecord record) {
+        def match = record.message =~ /^Skipped \[(.*?)\] because (.*)$/
+        if (match.find()) {
+            skipped << [event: "skip", file: match.group(1), reason: match.group(2)]
+        }
+    }
+    void flush() {}
+    void close() {}
+}
+log.addHandler(skipWatcher)
+
+def renamed = []
+try {
+    renamed = rename(file: args.getFiles()) ?: []
+} catch (Throwable e) {
+    emit([event: "error", message: e.message ?: e.toString()])
+    throw e
+} finally {
+    log.removeHandler(skipWatcher)
+    try {
+        def renameLog = getRenameLog()
+        // --action test writes no rename history. Without a summary the
+        // plain "[TEST] from [...] to [...]" log lines are parsed instead
+        if (!renameLog.isEmpty() || renamed.isEmpty()) {
+            renameLog.each { from, to ->
+                emit([event: "move", from: from.path, to: to.path])
+            }
+            skipped.each { emit(it) }
+            emit([event: "summary", processed: renameLog.size()])
+        }
+    } catch (MissingMethodException e) {
+        // older filebot without getRenameLog, the plain log lines are parsed
+    }
+}
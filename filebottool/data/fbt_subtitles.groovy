@@ -0,0 +1,24 @@
+// FileBotTool subtitle script.
+// Downloads missing subtitles for the given files in every language listed in
+// --def languages=en,de and logs one JSON object per event, each on its own
+// line:
+//   {"event": "subtitle", "language": "en", "file": "..."}
+//   {"event": "error", "language": "en", "message": "..."}
+import groovy.json.JsonOutput
+
+def emit(Map event) {
+    log.info(JsonOutput.toJson(event))
+}
+
+def files = args.getFiles()
+def languages = (_def.languages ?: "en").tokenize(",")*.trim()
+
+languages.each { language ->
+    try {
+        getMissingSubtitles(file: files, lang: language)?.each { subtitle ->
+            emit([event: "subtitle", language: language, file: subtitle.path])
+        }
+    } catch (Throwable e) {
+        emit([event: "error", language: language, message: e.message ?: e.toString()])
+    }
+}
@@ -0,0 +1,144 @@
+"""
+Content index of files that FileBotTool has already placed in the library.
+Used to link or skip files that were imported before instead of copying them
+again.
+"""
+from __future__ import absolute_import
+__author__ = 'laharah'
+
+import os
+import mmap
+import filecmp
+import hashlib
+
+from filebottool.common import LOG
+
+log = LOG
+
+BLOCK_SIZE = 64 * 1024
+
+
+def partial_hash(path):
+    """
+    hashes the head, middle and tail blocks of a file.
+    Args:
+        path: path of the file to hash
+
+    Returns: hex digest string
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha1()
+    if size == 0:  # empty files can't be mapped
+        return digest.hexdigest()
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if size <= 3 * BLOCK_SIZE:
+                digest.update(mapped[:])
+            else:
+                middle = (size - BLOCK_SIZE) // 2
+                for offset in (0, middle, size - BLOCK_SIZE):
+                    digest.update(mapped[offset:offset + BLOCK_SIZE])
+        finally:
+            mapped.close()
+    return digest.hexdigest()
+
+
+def _fingerprint(path):
+    """returns (size, partial_hash) of *path* or None"""
+    try:
+        return os.path.getsize(path), partial_hash(path)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def fingerprint_files(paths):
+    """
+    fingerprints files. Blocking, call it from a thread.
+    Args:
+        paths: list of file paths
+
+    Returns: dictionary in format {path: (size, partial_hash) or None}
+    """
+    return dict((path, _fingerprint(path)) for path in paths)
+
+
+def same_content(first, second):
+    """byte by byte comparison of two files. Blocking."""
+    try:
+        return (os.path.samefile(first, second) or
+                filecmp.cmp(first, second, shallow=False))
+    except (IOError, OSError):
+        return False
+
+
+def link_existing(source, existing, dest):
+    """
+    places the content of an already imported file at *dest* without copying.
+    Fingerprints only sample a file, so the full content of *source* and
+    *existing* is compared first.
+    Args:
+        source: the torrent file that would be imported
+        existing: path of the file already in the library
+        dest: the planned destination
+
+    Returns: "skipped" if dest is already that file or has the same content,
+        "linked" if a hardlink was created, or None if neither was possible.
+    """
+    if not same_content(source, existing):
+        log.debug("{0} only shares a fingerprint with {1}".format(source, existing))
+        return None
+    if os.path.exists(dest):
+        if same_content(existing, dest):
+            return "skipped"
+        return None
+    dest_dir = os.path.dirname(dest)
+    try:
+        if not os.path.isdir(dest_dir):
+            os.makedirs(dest_dir)
+        os.link(existing, dest)
+    except (AttributeError, OSError) as e:  # no os.link on py2 windows
+        log.debug("could not link {0} to {1}: {2}".format(existing, dest, e))
+        return None
+    return "linked"
+
+
+class DedupIndex(object):
+    """
+    Maps file fingerprints to the library path holding that content.
+
+    *config* is a deluge config object, the index is kept under its "index"
+    key in format {"size:hash": path}.
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    @staticmethod
+    def _key(fingerprint):
+        return "{0}:{1}".format(*fingerprint)
+
+    def lookup(self, fingerprint):
+        """returns the library path holding *fingerprint*, or None. Stale
+        entries are dropped."""
+        key = self._key(fingerprint)
+        path = self.config["index"].get(key)
+        if not path:
+            return None
+        try:
+            if os.path.getsize(path) == fingerprint[0]:
+                return path
+        except OSError:
+            pass
+        log.debug("dropping stale dedup entry {0}".format(path))
+        del self.config["index"][key]
+        return None
+
+    def add(self, fingerprint, path):
+        """records *path* as holding *fingerprint* unless a valid entry exists"""
+        if self.lookup(fingerprint):
+            return
+        self.config["index"][self._key(fingerprint)] = path
+
+    def save(self):
+        self.config.save()
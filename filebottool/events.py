@@ -38,3 +38,32 @@ class FileBotToolProcessingErrorEvent(DelugeEvent):
         else:
             error = ''
         self._args = [torrent_id, handler_name, error]
+
+
+class FileBotToolSubtitlesDownloadedEvent(DelugeEvent):
+    """
+    emitted when the background subtitle queue downloaded subtitles for a torrent
+    """
+
+    def __init__(self, torrent_id, handler_name, subtitles):
+        """
+        :param torrent_id: The id of the torrent.
+        :param handler_name: The handler name associated (can be None).
+        :param subtitles: list of the downloaded subtitle files.
+        """
+        self._args = [torrent_id, handler_name, subtitles]
+
+
+class FileBotToolSubtitlesErrorEvent(DelugeEvent):
+    """
+    emitted when the background subtitle queue failed to get subtitles for a torrent.
+    The torrent itself was already processed successfully.
+    """
+
+    def __init__(self, torrent_id, handler_name, error):
+        """
+        :param torrent_id: The id of the torrent.
+        :param handler_name: The handler name associated (can be None).
+        :param error: message describing the failure
+        """
+        self._args = [torrent_id, handler_name, str(error)]
@@ -12,6 +12,12 @@ import user_messenger
 
 log = LOG
 
+# settings edited through the handler widgets. Other settings, eg:
+# target_filter or schedule_window, have no widgets and are kept as loaded.
+WIDGET_SETTINGS = ["database", "rename_action", "on_conflict", "episode_order",
+                   "format_string", "encoding", "language_code", "subs_language",
+                   "query_override", "output", "show_advanced", "download_subs"]
+
 
 class HandlerUI(object):
     """
@@ -42,6 +48,8 @@ class HandlerUI(object):
         """
         self.glade = glade
         self.initial_settings = settings
+        # settings without widgets, kept when the settings are collected
+        self.hidden_settings = {}
         self.database_combo = self.glade.get_widget("database_combo")
         self.rename_action_combo = self.glade.get_widget("rename_action_combo")
         self.on_conflict_combo = self.glade.get_widget("on_conflict_combo")
@@ -95,6 +103,9 @@ class HandlerUI(object):
         Args:
           settings: The settings dict to populate.
         """
+        self.hidden_settings = dict(
+            (key, value) for key, value in settings.items()
+            if key not in WIDGET_SETTINGS)
         combo_value_pairs = [
             (self.database_combo, settings["database"]),
             (self.rename_action_combo, settings["rename_action"]),
@@ -140,7 +151,7 @@ class HandlerUI(object):
         a dict for sending to the server.
         returns: a dictionary containing the user's setting values
         """
-        settings = {}
+        settings = dict(self.hidden_settings)
 
         combos = {
             "database": self.database_combo,
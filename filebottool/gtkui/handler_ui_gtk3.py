@@ -15,6 +15,12 @@ from . import user_messenger_gtk3 as user_messenger
 
 log = LOG
 
+# settings edited through the handler widgets. Other settings, eg:
+# target_filter or schedule_window, have no widgets and are kept as loaded.
+WIDGET_SETTINGS = ["database", "rename_action", "on_conflict", "episode_order",
+                   "format_string", "encoding", "language_code", "subs_language",
+                   "query_override", "output", "show_advanced", "download_subs"]
+
 
 class HandlerUI(object):
     """
@@ -47,6 +53,8 @@ class HandlerUI(object):
         self.builder = builder
 
         self.initial_settings = settings
+        # settings without widgets, kept when the settings are collected
+        self.hidden_settings = {}
         self.database_combo = self.builder.get_object("database_combo")
         self.rename_action_combo = self.builder.get_object("rename_action_combo")
         self.on_conflict_combo = self.builder.get_object("on_conflict_combo")
@@ -96,6 +104,9 @@ class HandlerUI(object):
         Args:
           settings: The settings dict to populate.
         """
+        self.hidden_settings = dict(
+            (key, value) for key, value in settings.items()
+            if key not in WIDGET_SETTINGS)
         combo_value_pairs = [
             (self.database_combo, settings["database"]),
             (self.rename_action_combo, settings["rename_action"]),
@@ -144,7 +155,7 @@ class HandlerUI(object):
         a dict for sending to the server.
         returns: a dictionary containing the user's setting values
         """
-        settings = {}
+        settings = dict(self.hidden_settings)
 
         combos = {
             "database": self.database_combo,
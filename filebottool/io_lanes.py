@@ -0,0 +1,127 @@
+"""
+Per-device I/O lanes. File moves onto the same device are limited to a few
+at a time so they don't thrash the disk, while moves onto different devices
+run in parallel.
+"""
+from __future__ import absolute_import
+__author__ = 'laharah'
+
+import os
+
+# noinspection PyUnresolvedReferences
+from twisted.internet import defer
+
+from filebottool.common import LOG
+
+log = LOG
+
+
+def device_of(path):
+    """returns the st_dev of *path*, or of its closest existing parent"""
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+class IOLanes(object):
+    """
+    Keeps a DeferredSemaphore per destination device, allowing *per_device*
+    concurrent jobs on each.
+    """
+
+    def __init__(self, per_device=1):
+        self.per_device = per_device
+        self.lanes = {}
+        self.paths = {}
+
+    def _lane(self, device):
+        lane = self.lanes.get(device)
+        if lane is None or (lane.limit != self.per_device and
+                            not lane.waiting and lane.tokens == lane.limit):
+            lane = defer.DeferredSemaphore(self.per_device)
+            self.lanes[device] = lane
+        return lane
+
+    def run(self, destination, f, *args, **kwargs):
+        """
+        runs *f* in the lane of the device *destination* is on.
+        Args:
+            destination: the folder the job writes to
+            f: function returning a deferred or value
+
+        Returns: deferred firing with f's result
+        """
+        device = device_of(destination)
+        self.paths[device] = destination
+        lane = self._lane(device)
+        if not lane.tokens:
+            log.debug("waiting for I/O lane of {0}".format(destination))
+        return lane.run(f, *args, **kwargs)
+
+    def share(self, destination):
+        """returns a SharedLane in the lane of the device *destination* is
+        on, for a job with several runs writing to it"""
+        device = device_of(destination)
+        self.paths[device] = destination
+        return SharedLane(self._lane(device), destination)
+
+    def get_status(self):
+        """returns {device: {"path": example destination, "running": n,
+        "queued": n}}"""
+        return dict(
+            (str(device), {"path": self.paths.get(device),
+                           "running": lane.limit - lane.tokens,
+                           "queued": len(lane.waiting)})
+            for device, lane in self.lanes.items())
+
+
+class SharedLane(object):
+    """
+    One slot of a lane shared by every run of a job, eg: the parallel chunks
+    of a torrent. The first run takes the slot, the others run along with
+    it instead of queueing behind it. The slot is held until *release*.
+    """
+
+    def __init__(self, lane, destination=None):
+        self.lane = lane
+        self.destination = destination
+        self.held = False
+        self.closed = False
+        self.waiting = None
+
+    def run(self, f, *args, **kwargs):
+        """runs *f* once the job holds the slot, returns a deferred"""
+        if self.held:
+            return defer.maybeDeferred(f, *args, **kwargs)
+        d = defer.Deferred()
+        d.addCallback(lambda _: f(*args, **kwargs))
+        if self.waiting is not None:  # the slot is already being acquired
+            self.waiting.append(d)
+            return d
+        self.waiting = [d]
+        if not self.lane.tokens:
+            log.debug("waiting for I/O lane of {0}".format(self.destination))
+        self.lane.acquire().addCallback(self._acquired)
+        return d
+
+    def _acquired(self, _):
+        if self.closed:
+            self.lane.release()
+            return
+        self.held = True
+        waiting, self.waiting = self.waiting, []
+        for d in waiting:
+            d.callback(None)
+
+    def release(self):
+        """gives the slot back once the job's runs are done"""
+        self.closed = True
+        if self.held:
+            self.held = False
+            self.lane.release()
@@ -0,0 +1,184 @@
+"""
+Caches of FileBot matching outcomes, used to avoid paying for a FileBot run
+when the result is already known.
+"""
+from __future__ import absolute_import
+__author__ = 'laharah'
+
+import os
+import re
+import time
+import json
+import hashlib
+
+from filebottool.common import LOG
+
+log = LOG
+
+# settings that do not change how filebot matches files
+IGNORED_SETTINGS = ["rename_action", "launch_profile", "timeout", "job_id",
+                    "resource_policy"]
+
+_RELEASE_TAGS = re.compile(r"\[[^\]]*\]|\([^)]*\)")
+_EPISODE_MARKER = re.compile(
+    r"(?i)\bs\d{1,2}\s*e\d{1,3}|\b\d{1,2}x\d{2,3}\b|\bep(?:isode)?\s*\d+|"
+    r"\s-\s\d{1,4}\b")
+_TITLE_END = re.compile(r"(?i)\b(?:19|20)\d{2}\b|\b\d{3,4}p\b|\bseason\s*\d+")
+_MOVIE_YEAR = re.compile(r"\b((?:19|20)\d{2})\b")
+
+
+def make_key(targets, settings):
+    """
+    builds a cache key from a list of targets and handler settings.
+    Args:
+        targets: list of filebot targets
+        settings: dictionary of handler settings
+
+    Returns: hex digest string
+    """
+    settings = dict((k, v) for k, v in settings.items()
+                    if k not in IGNORED_SETTINGS)
+    digest = hashlib.sha1()
+    digest.update("\n".join(sorted(targets)).encode("utf-8"))
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _normalize_title(title):
+    return re.sub(r"[\W_]+", " ", title.lower(), flags=re.UNICODE).strip()
+
+
+def release_key(name):
+    """
+    normalizes a release name down to its title, and its year if the name
+    has one. The year tells apart shows and movies sharing a title.
+    Args:
+        name: file name or path of an episode or movie
+
+    Returns: lowercase key string, eg: "doctor who", "doctor who (2005)" or
+        "avatar (2009)", or None if *name* is neither
+    """
+    name = os.path.splitext(os.path.basename(name))[0]
+    name = _RELEASE_TAGS.sub(" ", name)
+    match = _EPISODE_MARKER.search(name)
+    if not match:
+        year = next((m for m in _MOVIE_YEAR.finditer(name) if m.start() > 0), None)
+        title = _normalize_title(name[:year.start()]) if year else None
+        return "{0} ({1})".format(title, year.group(1)) if title else None
+    title = name[:match.start()]
+    end = _TITLE_END.search(title)
+    year = None
+    if end:
+        title = title[:end.start()]
+        year = _MOVIE_YEAR.match(end.group(0))
+    title = _normalize_title(title)
+    if title and year:
+        return "{0} ({1})".format(title, year.group(1))
+    return title or None
+
+
+def has_year(query):
+    """returns True if a query names the year of a show or movie"""
+    return bool(query and _MOVIE_YEAR.search(query))
+
+
+def common_release_key(targets):
+    """returns the release key shared by every episode in *targets*, or None
+    if there are no episodes or they belong to different shows"""
+    keys = set(release_key(t) for t in targets)
+    keys.discard(None)
+    if len(keys) == 1:
+        return keys.pop()
+    return None
+
+
+class NegativeCache(object):
+    """
+    Remembers target lists FileBot could not match.
+
+    Each failure keeps the entry alive for *ttl* seconds, doubling with every
+    consecutive failure up to *max_ttl*.
+    """
+
+    def __init__(self, ttl=900, max_ttl=86400):
+        self.ttl = ttl
+        self.max_ttl = max_ttl
+        self.entries = {}
+
+    def check(self, key):
+        """returns the recorded error if *key* is a known failure, else None"""
+        entry = self.entries.get(key)
+        if entry and entry["expires"] > time.time():
+            return entry["error"]
+        return None
+
+    def record_failure(self, key, error):
+        entry = self.entries.setdefault(key, {"failures": 0})
+        entry["failures"] += 1
+        ttl = min(self.ttl * 2 ** (entry["failures"] - 1), self.max_ttl)
+        entry["expires"] = time.time() + ttl
+        entry["error"] = error
+        log.debug("no match cached for {0} seconds (failure {1})".format(
+            ttl, entry["failures"]))
+
+    def clear(self, key):
+        self.entries.pop(key, None)
+
+    def invalidate(self):
+        """forgets every recorded failure"""
+        self.entries.clear()
+
+
+class MatchMemo(object):
+    """
+    Remembers the database and query a show or movie was successfully matched
+    with.
+
+    *config* is a deluge config object, the memo is kept under its "memo" key
+    in format {release_key: [database, query]}. Matches filebot picked by
+    itself are only learned once the same match was observed *confirmations*
+    times in a row, they are counted under the "candidates" key in format
+    {release_key: {"match": [database, query], "count": n}}.
+    """
+
+    def __init__(self, config, confirmations=3):
+        self.config = config
+        self.confirmations = confirmations
+
+    def lookup(self, key):
+        """returns (database, query) for *key* or None"""
+        entry = self.config["memo"].get(key)
+        return tuple(entry) if entry else None
+
+    def learn(self, key, database, query):
+        """remembers a match, eg: a manual query override"""
+        self.config["candidates"].pop(key, None)
+        if self.lookup(key) == (database, query):
+            return
+        log.info("Remembering match [{0}] {1} for '{2}'".format(database, query, key))
+        self.config["memo"][key] = [database, query]
+        self.config.save()
+
+    def observe(self, key, database, query):
+        """counts a match filebot picked by itself, learning it once it was
+        seen *confirmations* times in a row"""
+        if self.lookup(key) == (database, query):
+            return
+        candidates = self.config["candidates"]
+        entry = candidates.get(key)
+        if entry and entry["match"] == [database, query]:
+            entry["count"] += 1
+        else:
+            entry = candidates[key] = {"match": [database, query], "count": 1}
+        if entry["count"] >= self.confirmations:
+            self.learn(key, database, query)
+        else:
+            self.config.save()
+
+    def forget(self, key):
+        forgotten = self.config["memo"].pop(key, None)
+        candidate = self.config["candidates"].pop(key, None)
+        if forgotten:
+            log.info("Forgetting match for '{0}'".format(key))
+        if forgotten or candidate:
+            self.config.save()
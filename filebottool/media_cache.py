@@ -0,0 +1,91 @@
+"""
+Persistent cache of FileBot mediainfo probes, so media properties of a file
+are only probed once.
+"""
+from __future__ import absolute_import
+__author__ = 'laharah'
+
+import os
+
+from filebottool.common import LOG
+
+log = LOG
+
+VIDEO_EXTENSIONS = {".mkv", ".mp4", ".m4v", ".avi", ".mov", ".wmv", ".ts",
+                    ".m2ts", ".mpg", ".mpeg", ".webm", ".flv", ".ogm"}
+
+
+def is_video(path):
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+class MediaInfoCache(object):
+    """
+    Maps files to their probed media properties.
+
+    *config* is a deluge config object, entries are kept under its "entries"
+    key in format {path: {"size": size, "mtime": mtime, "info": {...}}}. An
+    entry is only valid while the file's size and mtime are unchanged.
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, int(stat.st_mtime)
+
+    def lookup(self, path):
+        """returns the cached media properties of *path* or None"""
+        entry = self.config["entries"].get(path)
+        if not entry:
+            return None
+        if self._stat(path) != (entry["size"], entry["mtime"]):
+            del self.config["entries"][path]
+            return None
+        return entry["info"]
+
+    def store(self, path, info):
+        stat = self._stat(path)
+        if stat is None:
+            return
+        self.config["entries"][path] = {"size": stat[0], "mtime": stat[1],
+                                        "info": info}
+
+    def probe(self, paths, probe_function):
+        """
+        returns media properties for *paths*, calling *probe_function* only
+        for files that are not cached. Blocking.
+        Args:
+            paths: list of file paths
+            probe_function: function taking a list of paths and returning
+                {path: info}, eg: pyfilebot.mediainfo
+
+        Returns: dictionary in format {path: info}
+        """
+        results = {}
+        missing = []
+        for path in paths:
+            info = self.lookup(path)
+            if info is None:
+                missing.append(path)
+            else:
+                results[path] = info
+        if missing:
+            log.debug("probing media info of {0} files".format(len(missing)))
+            probed = probe_function(missing)
+            for path, info in probed.items():
+                self.store(path, info)
+            results.update(probed)
+            self.config.save()
+        return results
+
+    def prune(self):
+        """drops entries for files that no longer exist"""
+        gone = [path for path in self.config["entries"] if not os.path.exists(path)]
+        for path in gone:
+            del self.config["entries"][path]
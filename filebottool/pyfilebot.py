@@ -9,12 +9,19 @@ __version__ = "0.5.0"
 
 import re
 import os
+import time
+import shutil
 import tempfile
 import inspect
 import sys
 import warnings
 from types import MethodType
 import functools
+import threading
+import contextlib
+import json
+import signal
+from collections import OrderedDict
 
 from . import killableprocess
 import subprocess
@@ -76,6 +83,106 @@ FILEBOT_RENAME_ACTIONS = [
 
 FILEBOT_ON_CONFLICT = [None, "override", "skip", "auto", "index", "fail"]
 
+# format bindings preview_format_string can evaluate without filebot
+PREVIEW_BINDINGS = ["n", "y", "s", "e", "t", "vf", "ext"]
+
+# built in metadata for test file names, others are probed with filebot
+SAMPLE_METADATA = {
+    "Citizen Kane.avi": {"n": "Citizen Kane", "y": "1941", "ext": "avi"},
+}
+
+_PREVIEW_SEPARATOR = "~#~"
+
+# media properties reported by *mediainfo*, with the filebot expression for each
+MEDIAINFO_FIELDS = OrderedDict(
+    [
+        ("resolution", "{resolution}"),
+        ("video_format", "{vf}"),
+        ("video_codec", "{vc}"),
+        ("duration", "{minutes}"),
+        ("hdr", "{hdr}"),
+    ]
+)
+
+# longer command lines are passed to filebot through an argument file.
+# Windows caps command lines at 32767 characters.
+MAX_COMMAND_LENGTH = 30000 if os.name == "nt" else 100000
+
+# targets per filebot run, longer target lists are renamed in chunks
+MAX_TARGETS_PER_RUN = 1000
+
+# run renames through the bundled script that reports results as JSON lines.
+# output from filebot versions the script does not work with is parsed from
+# the plain log lines instead.
+STRUCTURED_OUTPUT = True
+RENAME_SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "fbt_rename.groovy"
+)
+# fetches subtitles in several languages with a single filebot run
+SUBTITLE_SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "fbt_subtitles.groovy"
+)
+
+# FileBot's own application data folder (license, preferences, cache)
+if os.name == "nt":
+    FILEBOT_DATA_DIR = os.path.join(os.environ.get("APPDATA", ""), "FileBot")
+else:
+    FILEBOT_DATA_DIR = os.path.expanduser("~/.filebot")
+
+# set to a folder to give each concurrent filebot process its own cache and
+# temp folders inside it. History and license stay in FILEBOT_DATA_DIR,
+# shared by every worker. Worker caches are seeded from the shared cache and
+# every CACHE_MERGE_INTERVAL seconds a worker's cache replaces the shared one.
+WORKER_DATA_ROOT = None
+CACHE_MERGE_INTERVAL = 600
+
+_worker_lock = threading.Lock()
+_cache_lock = threading.Lock()  # held while the shared cache is swapped
+_busy_workers = set()
+_worker_merge_times = {}
+
+# named JVM launch profiles. Keys:
+#   class_data_sharing: generate an AppCDS archive once per FileBot version,
+#       with a separate "-version" launch that also probes if the JVM
+#       supports it, and reuse it on every later launch
+#   heap_min / heap_max: java heap sizes, eg: "32m", "512m"
+#   gc: garbage collector, eg: "SerialGC", "ParallelGC", "G1GC"
+#   jvm_options: list of any extra jvm arguments
+LAUNCH_PROFILES = {"default": {}}
+DEFAULT_LAUNCH_PROFILE = "default"
+# folder for class data sharing archives, None uses the temp folder
+LAUNCH_DATA_DIR = None
+
+# seconds a filebot process may run before it is killed, None for no limit
+DEFAULT_TIMEOUT = None
+
+# named OS resource policies for filebot processes. Keys:
+#   nice: niceness of the process, eg: 10. On windows a positive value
+#       lowers the priority class
+#   ionice_class: "idle", "best-effort" or "realtime" (linux, needs ionice)
+#   ionice_level: 0-7, priority within the ionice class
+#   cgroup: cgroup v2 limits, eg: {"cpu.max": "50000 100000",
+#       "memory.max": "1G", "io.max": "8:0 wbps=10485760"}. Only applied if
+#       CGROUP_ROOT is a cgroup folder this process may create groups in.
+#       filebot is started through sh, which joins the group before exec
+RESOURCE_POLICIES = {"default": {}}
+DEFAULT_RESOURCE_POLICY = "default"
+CGROUP_ROOT = None
+
+_IONICE_CLASSES = {"realtime": "1", "best-effort": "2", "idle": "3"}
+_cgroup_lock = threading.Lock()
+_cgroups = {}
+
+_execution = threading.local()
+# module functions that use no handler settings and are not handler methods:
+# job control works across handlers, merge_results only combines results
+_NOT_HANDLER_METHODS = ("cancel_job", "clear_job", "job_running", "merge_results")
+_jobs_lock = threading.Lock()
+_job_processes = {}
+_cancelled_jobs = set()
+_NO_LAUNCH_PROFILE = object()
+_cds_lock = threading.Lock()
+_cds_state = {"version": None, "generating": set(), "unsupported": False}
 
 class Error(Exception):
     """Error baseclass for module"""
@@ -100,6 +207,24 @@ class FilebotRuntimeError(Error):
     pass
 
 
+class FilebotTimeoutError(FilebotRuntimeError):
+    """raised when a filebot run took longer than its timeout and was killed"""
+
+    pass
+
+
+class FilebotCancelledError(FilebotRuntimeError):
+    """raised when the job a filebot run belongs to was cancelled"""
+
+    pass
+
+
+class FilebotNoMatchError(FilebotRuntimeError):
+    """raised when filebot ran but could not match any of the targets"""
+
+    pass
+
+
 class FilebotLicenseError(Error):
     """raised when filebot is unlicensed"""
 
@@ -135,6 +260,24 @@ def debug_info():
     return sysinfo + output
 
 
+def startup_time(launch_profile=None):
+    """
+    measures how long filebot takes to start and exit under a launch profile.
+    Args:
+        launch_profile: name of the launch profile, None uses the default
+
+    Returns: seconds as a float
+    """
+    with _execution_context(launch_profile=launch_profile):
+        start = time.time()
+        return_code, output, error_data = _execute(["-version"], workaround=False)
+        elapsed = time.time() - start
+    if return_code != 0:
+        msg = "Filebot not found or could not run: {0}".format(error_data)
+        raise FilebotFatalError(msg)
+    return elapsed
+
+
 def rename(
     targets,
     format_string=None,
@@ -147,6 +290,7 @@ def rename(
     non_strict=True,
     recursive=True,
     language_code=None,
+    match_info=None,
 ):
     """Renames file or files from *targets* using the current settings
 
@@ -171,6 +315,10 @@ def rename(
             identifying files. set to False if you want to force an exact
             match. Defaults to True
         recursive: process folders recursively. Defaults to True
+        match_info: optional dictionary, filled with the database and
+            queries filebot matched against, see *parse_match_info*, and
+            "conclusive": True if filebot exited cleanly without an error
+            event, so processing 0 files means the files did not match
     Returns:
         a tuple consisting of:
             -number of processed files
@@ -182,6 +330,25 @@ def rename(
     if output:
         output = os.path.abspath(os.path.expandvars(os.path.expanduser(output)))
 
+    if (
+        not isinstance(targets, six.string_types)
+        and len(targets) > MAX_TARGETS_PER_RUN
+    ):
+        rename_chunk = functools.partial(
+            rename,
+            format_string=format_string,
+            database=database,
+            output=output,
+            rename_action=rename_action,
+            episode_order=episode_order,
+            on_conflict=on_conflict,
+            query_override=query_override,
+            non_strict=non_strict,
+            recursive=recursive,
+            language_code=language_code,
+        )
+        return _rename_in_chunks(rename_chunk, targets, match_info)
+
     filebot_arguments = _build_filebot_arguments(
         targets,
         format_string=format_string,
@@ -196,6 +363,9 @@ def rename(
         language_code=language_code,
     )
 
+    if STRUCTURED_OUTPUT and os.path.exists(RENAME_SCRIPT):
+        filebot_arguments[:1] = ["-script", RENAME_SCRIPT]
+
     # TODO:better error handling
     workaround = True if os.name == "nt" else False
     exit_code, data, filebot_error = _execute(filebot_arguments, workaround)
@@ -212,21 +382,63 @@ def rename(
             )
 
     try:
-        results = parse_filebot(data)
+        results = parse_structured_output(data) or parse_filebot(data)
     except:
         parse_error = True
     else:
         parse_error = False
 
-    if parse_error or (rename_action == "test" and results[0] == 0):
+    if parse_error:
         raise FilebotRuntimeError(
             "FILEBOT OUTPUT DUMP:\n{0}\nstderr:\n{1}".format(
                 data, filebot_error
             )
         )
+    if match_info is not None:
+        match_info.update(parse_match_info(data))
+        match_info["conclusive"] = exit_code == 0 and not any(
+            event.get("event") == "error" for event in iter_filebot_events(data))
+    if rename_action == "test" and results[0] == 0:
+        raise FilebotNoMatchError(
+            "FILEBOT OUTPUT DUMP:\n{0}\nstderr:\n{1}".format(
+                data, filebot_error
+            )
+        )
     return results
 
 
+def _rename_in_chunks(rename_chunk, targets, match_info=None):
+    """renames targets MAX_TARGETS_PER_RUN at a time and merges the results.
+    Chunks filebot could not match are skipped unless every chunk failed."""
+    results = []
+    no_match = None
+    conclusive = True
+    for start in range(0, len(targets), MAX_TARGETS_PER_RUN):
+        chunk_info = {}
+        try:
+            results.append(
+                rename_chunk(
+                    targets[start : start + MAX_TARGETS_PER_RUN], match_info=chunk_info
+                )
+            )
+        except FilebotNoMatchError as err:
+            no_match = err
+            continue
+        finally:
+            conclusive = conclusive and chunk_info.get("conclusive", False)
+            if match_info is not None:
+                match_info["conclusive"] = conclusive
+        if match_info is not None:
+            match_info["database"] = chunk_info["database"] or match_info.get(
+                "database"
+            )
+            queries = match_info.setdefault("queries", [])
+            queries.extend(q for q in chunk_info["queries"] if q not in queries)
+    if not results:
+        raise no_match
+    return merge_results(results)
+
+
 def parse_filebot(data):
     """Parses the output of a filebot run and returns relevant information
 
@@ -268,6 +480,94 @@ def parse_filebot(data):
     return total_processed_files, file_moves, skipped_files
 
 
+def iter_filebot_events(data):
+    """Decodes the JSON lines events logged by the bundled rename script
+
+    Lines that are not events (regular filebot log output) are ignored.
+
+    Args:
+        data: a string or iterable of lines containing filebot output
+
+    Yields:
+        event dictionaries, see data/fbt_rename.groovy for the formats
+    """
+    if isinstance(data, six.string_types):
+        data = data.splitlines()
+    for line in data:
+        line = line.strip()
+        if not line.startswith('{"event"'):
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(event, dict):
+            yield event
+
+
+def parse_structured_output(data):
+    """Parses the events logged by the bundled rename script
+
+    Args:
+        data: a string containing the output of a filebot run
+
+    Returns:
+        a tuple in the same format as *parse_filebot*, or None if the output
+        has no summary event (older filebot versions)
+    """
+    file_moves = []
+    skipped_files = []
+    total_processed_files = None
+    for event in iter_filebot_events(data):
+        kind = event.get("event")
+        if kind == "move":
+            file_moves.append((event["from"], event["to"]))
+        elif kind == "skip":
+            skipped_files.append(event["file"])
+        elif kind == "summary":
+            total_processed_files = event["processed"]
+    if total_processed_files is None:
+        return None
+    return total_processed_files, file_moves, skipped_files
+
+
+def merge_results(results):
+    """Merges the results of several filebot runs
+
+    Args:
+        results: list of tuples as returned by *parse_filebot*
+
+    Returns:
+        a single tuple in the same format
+    """
+    total_processed_files = sum(r[0] for r in results)
+    file_moves = [move for r in results for move in r[1]]
+    skipped_files = [skipped for r in results for skipped in r[2]]
+    return total_processed_files, file_moves, skipped_files
+
+
+def parse_match_info(data):
+    """Parses which database and queries a filebot run matched against
+
+    Args:
+        data: a string containing the output of a filebot run
+
+    Returns:
+        a dictionary in format {"database": database name or None,
+                                "queries": [matched series names]}
+    """
+    database = None
+    queries = []
+    for line in data.splitlines():
+        match = re.search(r"^Rename \w+ using \[(.*?)\]", line)
+        if match:
+            database = match.group(1)
+        match = re.search(r"^Fetching episode data for \[(.*?)\]", line)
+        if match and match.group(1) not in queries:
+            queries.append(match.group(1))
+    return {"database": database, "queries": queries}
+
+
 def test_format_string(format_string=None, file_name="Citizen Kane.avi"):
     """Runs a quick test of a format string and returns renamed sample
      filename
@@ -275,6 +575,9 @@ def test_format_string(format_string=None, file_name="Citizen Kane.avi"):
     Useful for testing to see if filebot will correctly parse a format
     string. By default uses a movie title, you must pass a custom filename
     to test a tv show style format string.
+    Common format strings are evaluated locally by *preview_format_string*,
+    filebot is only run for expressions it cannot evaluate. Results are
+    cached.
 
     Args:
         format_string: the string to be tested. defaults to filebot's default
@@ -286,17 +589,267 @@ def test_format_string(format_string=None, file_name="Citizen Kane.avi"):
         a string containing the renamed file_name using the format_string.
             Returns an empty string if no matches were found.
     """
+    key = (format_string, file_name)
+    result = _format_test_cache.get(key)
+    if result is not None:
+        return result
+
+    result = preview_format_string(format_string, file_name)
+    if result is None:
+        filebot_arguments = _build_filebot_arguments(
+            file_name, rename_action="test", format_string=format_string
+        )
+
+        _, data, _ = _execute(filebot_arguments)
+        _, file_moves, _ = parse_filebot(data)
+        if not file_moves:
+            result = ""
+        else:
+            result = _relative_destination(*file_moves[0])
+    _format_test_cache.put(key, result)
+    return result
+
+
+def _relative_destination(old, new):
+    """returns filebot's destination for *old* relative to its folder, like
+    the format string produced it. Destinations outside that folder are
+    returned unchanged."""
+    if os.path.isabs(old) and os.path.isabs(new):
+        relative = os.path.relpath(new, os.path.dirname(old))
+        if not relative.startswith(os.pardir):
+            return relative
+    return new
+
+
+def preview_format_string(format_string=None, file_name="Citizen Kane.avi"):
+    """Evaluates a format string locally against cached sample metadata
+
+    Supports the bindings in PREVIEW_BINDINGS plus {s00e00}, string
+    concatenation and simple string methods (lower, upper, trim, space,
+    replace, replaceAll, take, pad...). The first preview for a new
+    *file_name* runs filebot once to fetch its metadata.
+
+    Args:
+        format_string: the string to be tested.
+        file_name: an (imaginary) file name to test the format string
+            against.
+
+    Returns:
+        the renamed file_name, an empty string if filebot could not match
+            file_name, or None if the format string can't be evaluated
+            locally.
+    """
+    if not format_string:
+        return None
+    try:
+        segments = _parse_format(format_string)
+    except _PreviewUnsupported:
+        return None
+    metadata = _get_sample_metadata(file_name)
+    if metadata is None:
+        return ""
+    try:
+        name = "".join(_evaluate_segment(segment, metadata) for segment in segments)
+    except _PreviewUnsupported:
+        return None
+    ext = metadata.get("ext")
+    return "{0}.{1}".format(name, ext) if ext else name
+
+
+class _PreviewUnsupported(Exception):
+    """raised when a format expression can't be evaluated locally"""
 
+    pass
+
+
+class _PreviewUndefined(Exception):
+    """raised when a binding has no value, blanks the expression like filebot"""
+
+    pass
+
+
+class _LRUCache(object):
+    """small thread safe least recently used cache"""
+
+    def __init__(self, size=256):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return None
+            self._data[key] = value
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+
+_format_test_cache = _LRUCache()
+_sample_metadata_cache = _LRUCache(64)
+
+_FORMAT_TOKEN = re.compile(
+    r"\s*(?:(?P<string>'[^'\\]*'|\"[^\"\\$]*\")|(?P<regex>/(?:[^/\\]|\\.)+/)|"
+    r"(?P<number>\d+)|(?P<name>[A-Za-z_]\w*)|(?P<op>[.+(),]))"
+)
+
+_PREVIEW_METHODS = {
+    "lower": lambda v: v.lower(),
+    "toLowerCase": lambda v: v.lower(),
+    "upper": lambda v: v.upper(),
+    "toUpperCase": lambda v: v.upper(),
+    "trim": lambda v: v.strip(),
+    "upperInitial": lambda v: re.sub(r"\b(\w)", lambda m: m.group(1).upper(), v),
+    "space": lambda v, c: re.sub(r"\s+", c, v),
+    "replace": lambda v, a, b: v.replace(a, b),
+    "replaceAll": lambda v, a, b: re.sub(a, b.replace("$", "\\"), v),
+    "take": lambda v, n: v[:n],
+    "pad": lambda v, n: v.zfill(n),
+}
+
+
+def _tokenize_expression(expression):
+    """splits a groovy expression into (kind, value) tokens"""
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _FORMAT_TOKEN.match(expression, position)
+        if not match:
+            raise _PreviewUnsupported(expression)
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            value = value[1:-1]
+        elif kind == "regex":
+            value = value[1:-1].replace("\\/", "/")
+        elif kind == "number":
+            value = int(value)
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+def _parse_format(format_string):
+    """splits a format string into literal strings and parsed expressions"""
+    segments = []
+    position = 0
+    for match in re.finditer(r"{([^{}]*)}", format_string):
+        segments.append(format_string[position:match.start()])
+        segments.append(_parse_expression(_tokenize_expression(match.group(1))))
+        position = match.end()
+    segments.append(format_string[position:])
+    for segment in segments[::2]:
+        if "{" in segment or "}" in segment:  # nested closures
+            raise _PreviewUnsupported(format_string)
+    return segments
+
+
+def _parse_expression(tokens):
+    """parses tokens into a list of terms to be concatenated, each term being
+    (atom, [(method, args), ...])"""
+    terms = []
+    position = 0
+    while True:
+        if position >= len(tokens) or tokens[position][0] not in ("name", "string"):
+            raise _PreviewUnsupported(tokens)
+        atom = tokens[position]
+        position += 1
+        methods = []
+        while position < len(tokens) and tokens[position] == ("op", "."):
+            try:
+                (kind, method), paren = tokens[position + 1], tokens[position + 2]
+            except IndexError:
+                raise _PreviewUnsupported(tokens)
+            if kind != "name" or method not in _PREVIEW_METHODS or paren != ("op", "("):
+                raise _PreviewUnsupported(tokens)
+            position += 3
+            args = []
+            while tokens[position:position + 1] != [("op", ")")]:
+                if args:  # arguments must be separated by commas
+                    if tokens[position:position + 1] != [("op", ",")]:
+                        raise _PreviewUnsupported(tokens)
+                    position += 1
+                if (position >= len(tokens) or
+                        tokens[position][0] not in ("string", "regex", "number")):
+                    raise _PreviewUnsupported(tokens)
+                args.append(tokens[position][1])
+                position += 1
+            position += 1
+            methods.append((method, args))
+        terms.append((atom, methods))
+        if position == len(tokens):
+            return terms
+        if tokens[position] != ("op", "+"):
+            raise _PreviewUnsupported(tokens)
+        position += 1
+
+
+def _evaluate_segment(segment, metadata):
+    """evaluates a parsed segment, undefined bindings blank the expression"""
+    if isinstance(segment, six.string_types):
+        return segment
+    try:
+        return "".join(_evaluate_term(term, metadata) for term in segment)
+    except _PreviewUndefined:
+        return ""
+
+
+def _evaluate_term(term, metadata):
+    (kind, value), methods = term
+    if kind == "name":
+        if value == "s00e00":
+            value = "S{0:02d}E{1:02d}".format(
+                int(_binding(metadata, "s")), int(_binding(metadata, "e")))
+        else:
+            value = _binding(metadata, value)
+    for method, args in methods:
+        try:
+            value = _PREVIEW_METHODS[method](value, *args)
+        except (TypeError, re.error):
+            raise _PreviewUnsupported(method)
+    return value
+
+
+def _binding(metadata, name):
+    if name not in PREVIEW_BINDINGS:
+        raise _PreviewUnsupported(name)
+    value = metadata.get(name)
+    if not value:
+        raise _PreviewUndefined(name)
+    return value
+
+
+def _get_sample_metadata(file_name):
+    """returns the preview bindings of a test file name, running filebot once
+    to fetch them if they are unknown. Returns None if filebot can't match it.
+    """
+    if file_name in SAMPLE_METADATA:
+        return SAMPLE_METADATA[file_name]
+    metadata = _sample_metadata_cache.get(file_name)
+    if metadata is not None:
+        return metadata or None
+    probe = _PREVIEW_SEPARATOR.join("{%s}" % b for b in PREVIEW_BINDINGS)
     filebot_arguments = _build_filebot_arguments(
-        file_name, rename_action="test", format_string=format_string
+        file_name, rename_action="test", format_string=probe + _PREVIEW_SEPARATOR
     )
-
     _, data, _ = _execute(filebot_arguments)
     _, file_moves, _ = parse_filebot(data)
     if not file_moves:
-        return ""
+        metadata = None
     else:
-        return file_moves[0][1]
+        values = os.path.basename(file_moves[0][1]).split(_PREVIEW_SEPARATOR)
+        metadata = dict(zip(PREVIEW_BINDINGS, values))
+    _sample_metadata_cache.put(file_name, metadata or {})
+    return metadata
 
 
 def get_subtitles(target, language_code=None, encoding=None, force=False, output=None):
@@ -311,7 +864,8 @@ def get_subtitles(target, language_code=None, encoding=None, force=False, output
         target: The file/folder or list of files/folders you want filebot
         to find subtitles for
         language_code: the 2 letter language code of the language you
-            want. Uses the filebot default if not designated
+            want, or a list of codes to get every one of those languages in
+            the same filebot run. Uses the filebot default if not designated
         encoding: the output charset filebot should use (UTF-8, etc...)
         force: a flag to force filebot to ignore pre-exsisting subtitle
             files
@@ -321,6 +875,11 @@ def get_subtitles(target, language_code=None, encoding=None, force=False, output
     """
     mode = "-get-subtitles"
 
+    if not isinstance(language_code, six.string_types) and language_code:
+        if len(language_code) > 1:
+            return _get_subtitles_multi(target, language_code, encoding)
+        language_code = language_code[0]
+
     if output:
         output = output.lower().strip
         if output != "srt":
@@ -343,6 +902,51 @@ def get_subtitles(target, language_code=None, encoding=None, force=False, output
     return [name[1] for name in downloads]
 
 
+def _get_subtitles_multi(target, language_codes, encoding=None):
+    """gets subtitles in several languages, returns a flat list"""
+    by_language = get_subtitles_by_language(target, language_codes, encoding)
+    return [sub for code in language_codes for sub in by_language.get(code, [])]
+
+
+def get_subtitles_by_language(target, language_codes, encoding=None):
+    """
+    Gets missing subtitles in several languages with a single filebot run
+    using the bundled subtitle script.
+
+    Args:
+        target: The file/folder or list of files/folders you want filebot
+        to find subtitles for
+        language_codes: list of 2 letter language codes
+        encoding: the output charset filebot should use (UTF-8, etc...)
+
+    Returns:
+        dictionary in format {language_code: [downloaded subtitle files]}.
+        Languages that failed are left out. Raises FilebotRuntimeError if
+        every language failed.
+    """
+    if isinstance(target, six.string_types):
+        target = [target]
+    target = [os.path.expanduser(os.path.expandvars(t)) for t in target]
+    filebot_arguments = _build_script_arguments(
+        SUBTITLE_SCRIPT, ["--def", "languages={0}".format(",".join(language_codes))]
+    )
+    if encoding:
+        filebot_arguments += ["--encoding", encoding]
+    code, data, error = _execute(filebot_arguments + target)
+
+    downloads = dict((code, []) for code in language_codes)
+    for event in iter_filebot_events(data):
+        if event.get("event") == "subtitle":
+            downloads.setdefault(event["language"], []).append(event["file"])
+        elif event.get("event") == "error":
+            downloads.pop(event.get("language"), None)
+    if code != 0 or not downloads:
+        raise FilebotRuntimeError(
+            "FILEBOT OUTPUT DUMP:\n{0}\nstderr:\n{1}".format(data, error)
+        )
+    return downloads
+
+
 def get_history(targets):
     """returns the filebot history of given targets on a file by
         file basis.
@@ -403,6 +1007,122 @@ def revert(targets):
     return file_moves
 
 
+def get_history_bulk(target_groups):
+    """returns the filebot history of several groups of targets using a
+        single filebot run.
+
+    Args:
+        target_groups: dictionary in format {key: targets}, targets being a
+            file/folder or list of files/folders
+
+    Returns:
+        dictionary in format {key: [(current_filename, previous_filename)]}
+    """
+    target_groups = _normalize_target_groups(target_groups)
+    history = get_history([t for ts in target_groups.values() for t in ts])
+    return _group_by_target(target_groups, history)
+
+
+def revert_bulk(target_groups):
+    """reverts several groups of targets using a single filebot run.
+
+    Args:
+        target_groups: dictionary in format {key: targets}, targets being a
+            file/folder or list of files/folders
+
+    Returns:
+        dictionary in format {key: (processed, moves, skipped)}, see *revert*
+    """
+    target_groups = _normalize_target_groups(target_groups)
+    _, moves, skipped = revert([t for ts in target_groups.values() for t in ts])
+    moves = _group_by_target(target_groups, moves)
+    skipped = _group_by_target(target_groups, [(f,) for f in skipped])
+    return dict(
+        (key, (len(moves[key]), moves[key], [f[0] for f in skipped[key]]))
+        for key in target_groups
+    )
+
+
+def _normalize_target_groups(target_groups):
+    normalized = {}
+    for key, targets in target_groups.items():
+        if isinstance(targets, six.string_types):
+            targets = [targets]
+        normalized[key] = [
+            os.path.expanduser(os.path.expandvars(target)) for target in targets
+        ]
+    return normalized
+
+
+def _group_by_target(target_groups, items):
+    """sorts tuples whose first item is a file path into the group whose
+    targets contain that file. Items matching no group are dropped."""
+    owners = {}
+    folders = []
+    for key, targets in target_groups.items():
+        for target in targets:
+            owners[os.path.normpath(target)] = key
+            folders.append((os.path.normpath(target) + os.sep, key))
+    grouped = dict((key, []) for key in target_groups)
+    for item in items:
+        path = os.path.normpath(item[0])
+        key = owners.get(path)
+        if key is None:
+            key = next((k for folder, k in folders if path.startswith(folder)), None)
+        if key is None:
+            continue
+        grouped[key].append(item)
+    return grouped
+
+
+def mediainfo(targets):
+    """
+    probes media properties of files, MAX_TARGETS_PER_RUN files per filebot run.
+
+    Args:
+        targets: file or list of files to probe
+
+    Returns:
+        dictionary in format {path: {field: value}} using the fields in
+        MEDIAINFO_FIELDS. Values filebot could not determine are empty
+        strings, files filebot could not read are left out.
+    """
+    if isinstance(targets, six.string_types):
+        targets = [targets]
+    targets = [os.path.expanduser(os.path.expandvars(t)) for t in targets]
+    format_string = _PREVIEW_SEPARATOR.join(["{f}"] + list(MEDIAINFO_FIELDS.values()))
+    results = {}
+    for start in range(0, len(targets), MAX_TARGETS_PER_RUN):
+        filebot_arguments = _build_filebot_arguments(
+            targets[start : start + MAX_TARGETS_PER_RUN],
+            format_string=format_string,
+            mode="mediainfo",
+            recursive=False,
+            encoding=None,
+            on_confilct=None,
+            non_strict=False,
+            rename_action=None,
+        )
+        exit_code, data, error = _execute(filebot_arguments, workaround=False)
+        if exit_code != 0:
+            raise FilebotRuntimeError(
+                "FILEBOT OUTPUT DUMP:\n{0}\nstderr:\n{1}".format(data, error)
+            )
+        results.update(parse_mediainfo(data))
+    return results
+
+
+def parse_mediainfo(data):
+    """parses the output of a *mediainfo* filebot run"""
+    results = {}
+    for line in data.splitlines():
+        values = line.split(_PREVIEW_SEPARATOR)
+        if len(values) != len(MEDIAINFO_FIELDS) + 1:
+            continue
+        results[values[0]] = dict(zip(MEDIAINFO_FIELDS, (v.strip() for v in values[1:])))
+    return results
+
+
 def license(license_path):
     """Activates a FileBot license.
 
@@ -674,6 +1394,12 @@ def _execute(process_arguments, workaround=False):
     file_temp.close()
     if six.PY3:
         workaround = False
+
+    argument_file = None
+    if sum(len(arg) + 1 for arg in process_arguments) > MAX_COMMAND_LENGTH:
+        argument_file = _write_argument_file(process_arguments)
+        process_arguments = ["@" + argument_file]
+
     if workaround:
         process_arguments = [
             FILEBOT_EXE,
@@ -683,6 +1409,10 @@ def _execute(process_arguments, workaround=False):
     else:
         process_arguments = [FILEBOT_EXE] + process_arguments
 
+    policy_name, policy = _current_resource_policy()
+    process_arguments = (_cgroup_command_prefix(policy_name, policy) +
+                         _policy_command_prefix(policy) + process_arguments)
+
     if os.name == "nt" and six.PY2:  # used to hide cmd window popup
         startupinfo = killableprocess.winprocess.STARTUPINFO()
         startupinfo.dwFlags |= killableprocess.winprocess.STARTF_USESHOWWINDOW
@@ -693,19 +1423,54 @@ def _execute(process_arguments, workaround=False):
         sp = killableprocess
     else:
         sp = subprocess
-    try:
-        process = sp.Popen(
-            process_arguments,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            stdin=subprocess.PIPE,
-            startupinfo=startupinfo,
-        )
-    except OSError as e:
-        raise FilebotFatalError("Error running Filebot! {0}".format(str(e)))
 
-    stdout, error = process.communicate()
-    exit_code = process.returncode
+    job_ids = _job_ids(getattr(_execution, "job_id", None))
+    timeout = getattr(_execution, "timeout", None) or DEFAULT_TIMEOUT
+    if _job_cancelled(job_ids):
+        os.remove(file_temp.name)
+        if argument_file:
+            os.remove(argument_file)
+        raise FilebotCancelledError("Job {0} was cancelled.".format(job_ids))
+
+    worker = _acquire_worker() if WORKER_DATA_ROOT else None
+    timed_out = threading.Event()
+    try:
+        jvm_options = _launch_options(_current_launch_profile())
+        try:
+            process = sp.Popen(
+                process_arguments,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                stdin=subprocess.PIPE,
+                startupinfo=startupinfo,
+                env=_process_environment(worker, jvm_options),
+                **_process_options(policy)
+            )
+        except OSError as e:
+            raise FilebotFatalError("Error running Filebot! {0}".format(str(e)))
+
+        _register_process(job_ids, process)
+        timer = None
+        if timeout:
+            def expire():
+                timed_out.set()
+                _kill_process(process)
+
+            timer = threading.Timer(timeout, expire)
+            timer.daemon = True
+            timer.start()
+        if _job_cancelled(job_ids):  # cancelled while starting
+            _kill_process(process)
+        try:
+            stdout, error = process.communicate()
+        finally:
+            if timer:
+                timer.cancel()
+            _unregister_process(job_ids, process)
+        exit_code = process.returncode
+    finally:
+        if worker is not None:
+            _release_worker(worker)
 
     if workaround:
         with open(file_temp.name, "rU") as log:
@@ -715,6 +1480,8 @@ def _execute(process_arguments, workaround=False):
         data = stdout
 
     os.remove(file_temp.name)
+    if argument_file:
+        os.remove(argument_file)
     try:
         data = data.decode('utf8', errors="ignore")
     except AttributeError:
@@ -724,9 +1491,380 @@ def _execute(process_arguments, workaround=False):
     except AttributeError:
         pass
 
+    if _job_cancelled(job_ids):
+        raise FilebotCancelledError(
+            "Job {0} was cancelled.\nFILEBOT OUTPUT DUMP:\n{1}".format(job_ids, data)
+        )
+    if timed_out.is_set():
+        raise FilebotTimeoutError(
+            "Filebot did not finish within {0} seconds and was killed.\n"
+            "FILEBOT OUTPUT DUMP:\n{1}".format(timeout, data)
+        )
     return exit_code, data, error
 
 
+def _process_environment(worker=None, jvm_options=None):
+    """builds the environment for a filebot process. Returns None to inherit
+    the current environment unchanged."""
+    if worker is None and not jvm_options:
+        return None
+    env = dict(os.environ)
+    if jvm_options:
+        options = [env.get("JAVA_OPTS", "")] + jvm_options
+        env["JAVA_OPTS"] = " ".join(o for o in options if o)
+    if worker is not None:
+        data_dir = _worker_data_dir(worker)
+        options = [env.get("FILEBOT_OPTS", "")]
+        options.append("-Dapplication.cache={0}".format(
+            os.path.join(data_dir, "cache")))
+        options.append("-Djava.io.tmpdir={0}".format(os.path.join(data_dir, "tmp")))
+        env["FILEBOT_OPTS"] = " ".join(o for o in options if o)
+    return env
+
+
+@contextlib.contextmanager
+def _execution_context(**settings):
+    """applies execution settings (launch_profile, timeout, job_id,
+    resource_policy) to the filebot calls made inside the block on this
+    thread"""
+    previous = dict((k, getattr(_execution, k, None)) for k in settings)
+    for key, value in settings.items():
+        setattr(_execution, key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            setattr(_execution, key, value)
+
+
+def _job_ids(job_id):
+    """a run can belong to several jobs, eg: a bulk revert"""
+    if job_id is None:
+        return ()
+    if isinstance(job_id, (list, tuple, set)):
+        return tuple(job_id)
+    return (job_id,)
+
+
+def cancel_job(job_id):
+    """
+    cancels a job: kills its running filebot processes, and its later
+    filebot runs fail with FilebotCancelledError until *clear_job* is called.
+    Args:
+        job_id: the id the job's runs were started with
+
+    Returns: number of processes killed
+    """
+    with _jobs_lock:
+        _cancelled_jobs.add(job_id)
+        processes = list(_job_processes.get(job_id, ()))
+    for process in processes:
+        _kill_process(process)
+    return len(processes)
+
+
+def clear_job(job_id):
+    """forgets that a job was cancelled"""
+    with _jobs_lock:
+        _cancelled_jobs.discard(job_id)
+
+
+def job_running(job_id):
+    """returns True if the job has a filebot process running"""
+    with _jobs_lock:
+        return bool(_job_processes.get(job_id))
+
+
+def _job_cancelled(job_ids):
+    with _jobs_lock:
+        return any(job_id in _cancelled_jobs for job_id in job_ids)
+
+
+def _register_process(job_ids, process):
+    with _jobs_lock:
+        for job_id in job_ids:
+            _job_processes.setdefault(job_id, set()).add(process)
+
+
+def _unregister_process(job_ids, process):
+    with _jobs_lock:
+        for job_id in job_ids:
+            processes = _job_processes.get(job_id, set())
+            processes.discard(process)
+            if not processes:
+                _job_processes.pop(job_id, None)
+
+
+def _process_options(policy=None):
+    """Popen arguments starting filebot in its own process group, so the jvm
+    and anything it started can be killed together, and with a lowered
+    priority class on windows if the resource policy asks for it"""
+    if six.PY2:
+        return {}  # killableprocess handles groups on py2
+    if os.name != "nt":
+        return {"start_new_session": True}
+    nice = (policy or {}).get("nice") or 0
+    if nice >= 15:
+        return {"creationflags": 0x00000040}  # IDLE_PRIORITY_CLASS
+    if nice > 0:
+        return {"creationflags": 0x00004000}  # BELOW_NORMAL_PRIORITY_CLASS
+    return {}
+
+
+def _current_resource_policy():
+    """returns (name, policy) of the resource policy for this thread's runs"""
+    name = getattr(_execution, "resource_policy", None) or DEFAULT_RESOURCE_POLICY
+    if name not in RESOURCE_POLICIES:
+        name = DEFAULT_RESOURCE_POLICY
+    return name, RESOURCE_POLICIES.get(name) or {}
+
+
+def _policy_command_prefix(policy):
+    """returns the nice/ionice command prefix applying a resource policy"""
+    if os.name == "nt":
+        return []
+    prefix = []
+    if policy.get("nice"):
+        nice = spawn.find_executable("nice")
+        if nice:
+            prefix += [nice, "-n", str(policy["nice"])]
+    ionice_class = _IONICE_CLASSES.get(policy.get("ionice_class"))
+    if ionice_class:
+        ionice = spawn.find_executable("ionice")
+        if ionice:
+            prefix += [ionice, "-c", ionice_class]
+            if policy.get("ionice_level") is not None and ionice_class != "3":
+                prefix += ["-n", str(policy["ionice_level"])]
+    return prefix
+
+
+def _cgroup_command_prefix(policy_name, policy):
+    """returns a sh command prefix that moves itself into the policy's
+    cgroup and then execs the command, so the jvm starts inside the group"""
+    if os.name == "nt" or not policy.get("cgroup"):
+        return []
+    path = _cgroup_path(policy_name, policy["cgroup"])
+    if not path:
+        return []
+    return ["/bin/sh", "-c", 'echo $$ > "$0/cgroup.procs"; exec "$@"', path]
+
+
+def _cgroup_path(policy_name, limits):
+    """returns the policy's cgroup under CGROUP_ROOT, creating it with
+    *limits* the first time. None without permission."""
+    if not CGROUP_ROOT:
+        return None
+    with _cgroup_lock:
+        path = _cgroups.get(policy_name)
+        if path is None:
+            path = os.path.join(CGROUP_ROOT, "filebottool-{0}".format(policy_name))
+            try:
+                if not os.path.isdir(path):
+                    os.mkdir(path)
+                for limit, value in limits.items():
+                    with open(os.path.join(path, limit), "w") as f:
+                        f.write(str(value))
+            except (IOError, OSError) as e:
+                warnings.warn("Could not set up cgroup {0}: {1}".format(path, e))
+                path = False
+            _cgroups[policy_name] = path
+    return path or None
+
+
+def reset_cgroups():
+    """forgets the set up cgroups, so changed limits are written again, and
+    removes the groups of earlier settings that have no processes left"""
+    with _cgroup_lock:
+        paths = set(path for path in _cgroups.values() if path)
+        _cgroups.clear()
+        if CGROUP_ROOT and os.path.isdir(CGROUP_ROOT):
+            paths.update(os.path.join(CGROUP_ROOT, name)
+                         for name in os.listdir(CGROUP_ROOT)
+                         if name.startswith("filebottool-"))
+        for path in paths:
+            try:
+                os.rmdir(path)
+            except OSError:  # filebot still running in it
+                pass
+
+
+def _kill_process(process):
+    """kills a filebot process and its process group"""
+    try:
+        if six.PY2:
+            process.kill(group=True)
+        elif os.name != "nt":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except OSError:  # already exited
+        pass
+
+
+def _current_launch_profile():
+    name = getattr(_execution, "launch_profile", None) or DEFAULT_LAUNCH_PROFILE
+    if name is _NO_LAUNCH_PROFILE:
+        return {}
+    if isinstance(name, dict):  # internal launches with their own options
+        return name
+    profile = LAUNCH_PROFILES.get(name)
+    if profile is None:
+        profile = LAUNCH_PROFILES.get(DEFAULT_LAUNCH_PROFILE, {})
+    return profile
+
+
+def _launch_options(profile):
+    """
+    builds the jvm arguments for a launch profile. Launches before the class
+    data sharing archive exists start generating it in the background and
+    run without it.
+    Returns: list of jvm options
+    """
+    options = []
+    if profile.get("heap_min"):
+        options.append("-Xms{0}".format(profile["heap_min"]))
+    if profile.get("heap_max"):
+        options.append("-Xmx{0}".format(profile["heap_max"]))
+    if profile.get("gc"):
+        options.append("-XX:+Use{0}".format(profile["gc"]))
+    if profile.get("class_data_sharing") and not _cds_state["unsupported"]:
+        path = _cds_archive_path()
+        if path and os.path.exists(path):
+            options += ["-Xshare:auto", "-XX:SharedArchiveFile={0}".format(path)]
+        elif path:
+            with _cds_lock:
+                start = path not in _cds_state["generating"]
+                _cds_state["generating"].add(path)
+            if start:
+                thread = threading.Thread(target=_generate_cds_archive, args=(path,))
+                thread.daemon = True
+                thread.start()
+    options += profile.get("jvm_options", [])
+    return options
+
+
+def _cds_archive_path():
+    """returns the archive path for the installed filebot version"""
+    if _cds_state["version"] is None:
+        with _execution_context(launch_profile=_NO_LAUNCH_PROFILE):
+            try:
+                _cds_state["version"] = get_version()
+            except FilebotFatalError:
+                return None
+    version = re.sub(r"[^\w.-]+", "_", _cds_state["version"]).strip("_")
+    return os.path.join(
+        LAUNCH_DATA_DIR or tempfile.gettempdir(),
+        "filebot-{0}.jsa".format(version[:80]),
+    )
+
+
+def _generate_cds_archive(path):
+    """generates a class data sharing archive with a "-version" launch.
+    JVMs older than 13 refuse to start with -XX:ArchiveClassesAtExit, then
+    class data sharing is disabled instead of failing real jobs."""
+    try:
+        archive_dir = os.path.dirname(path)
+        if not os.path.isdir(archive_dir):
+            os.makedirs(archive_dir)
+        profile = {"jvm_options": ["-XX:ArchiveClassesAtExit={0}".format(path)]}
+        with _execution_context(launch_profile=profile, job_id=None):
+            exit_code, _, _ = _execute(["-version"], workaround=False)
+        if exit_code != 0 or not os.path.exists(path):
+            _cds_state["unsupported"] = True
+    except (Error, IOError, OSError):
+        _cds_state["unsupported"] = True
+    finally:
+        with _cds_lock:
+            _cds_state["generating"].discard(path)
+
+
+def _worker_data_dir(worker):
+    return os.path.join(WORKER_DATA_ROOT, "worker-{0}".format(worker))
+
+
+def _acquire_worker():
+    """reserves the lowest free worker number and makes sure its folder
+    exists, seeding its cache from FILEBOT_DATA_DIR"""
+    with _worker_lock:
+        worker = 0
+        while worker in _busy_workers:
+            worker += 1
+        _busy_workers.add(worker)
+        data_dir = _worker_data_dir(worker)
+        if not os.path.isdir(data_dir):
+            try:
+                shared_cache = os.path.join(FILEBOT_DATA_DIR, "cache")
+                if os.path.isdir(shared_cache):
+                    with _cache_lock:
+                        shutil.copytree(shared_cache, os.path.join(data_dir, "cache"))
+                os.makedirs(os.path.join(data_dir, "tmp"))
+            except (IOError, OSError, shutil.Error):
+                _busy_workers.discard(worker)
+                raise FilebotFatalError(
+                    "Could not create filebot worker folder {0}".format(data_dir)
+                )
+            _worker_merge_times[worker] = time.time()
+    return worker
+
+
+def _release_worker(worker):
+    """frees a worker, first merging its cache back if it is due. The worker
+    stays reserved while its cache is copied, without blocking launches."""
+    with _worker_lock:
+        due = time.time() - _worker_merge_times.get(worker, 0) >= CACHE_MERGE_INTERVAL
+        if due:
+            _worker_merge_times[worker] = time.time()
+    try:
+        if due:
+            _merge_worker_cache(worker)
+    finally:
+        with _worker_lock:
+            _busy_workers.discard(worker)
+
+
+def _merge_worker_cache(worker):
+    """replaces the cache in FILEBOT_DATA_DIR with a worker's cache. The
+    cache is copied next to the shared one and swapped in as a whole, so
+    files of different cache generations are never mixed."""
+    source = os.path.join(_worker_data_dir(worker), "cache")
+    destination = os.path.join(FILEBOT_DATA_DIR, "cache")
+    if not os.path.isdir(source):
+        return
+    try:
+        if not os.path.isdir(FILEBOT_DATA_DIR):
+            os.makedirs(FILEBOT_DATA_DIR)
+        staging = tempfile.mkdtemp(prefix="cache-", dir=FILEBOT_DATA_DIR)
+    except (IOError, OSError):
+        return
+    previous = os.path.join(staging, "previous")
+    try:
+        shutil.copytree(source, os.path.join(staging, "cache"))
+        with _cache_lock:
+            if os.path.isdir(destination):
+                os.rename(destination, previous)
+            try:
+                os.rename(os.path.join(staging, "cache"), destination)
+            except OSError:
+                if os.path.isdir(previous):
+                    os.rename(previous, destination)
+                raise
+    except (IOError, OSError, shutil.Error):
+        pass  # keep the shared cache, the next merge tries again
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _write_argument_file(process_arguments):
+    """writes arguments to a temp file, one per line, for filebot's @file
+    syntax. Returns the path of the file."""
+    argument_file = tempfile.NamedTemporaryFile(
+        suffix=".args", delete=False, mode="wb"
+    )
+    with argument_file:
+        argument_file.write("\n".join(process_arguments).encode("utf-8"))
+    return argument_file.name
+
+
 class FilebotHandler(object):
     """A convenience class for interacting with filebot.
 
@@ -782,6 +1920,13 @@ class FilebotHandler(object):
              to true
         mode: the function you would like filebot to execute. Defaults to
             'rename'. Very rarely used
+        launch_profile: name of the jvm launch profile in LAUNCH_PROFILES
+            filebot is started with. None uses the default profile
+        timeout: seconds a filebot run may take before it is killed. None
+            uses DEFAULT_TIMEOUT
+        job_id: id the handler's filebot runs belong to, see *cancel_job*
+        resource_policy: name of the OS resource policy in RESOURCE_POLICIES
+            filebot processes run under. None uses the default policy
 
     Methods:
         Implements all the functions in pyfilebot as methods using handler
@@ -807,6 +1952,10 @@ class FilebotHandler(object):
         query_override=None,
         non_strict=True,
         mode="rename",
+        launch_profile=None,
+        timeout=None,
+        job_id=None,
+        resource_policy=None,
     ):
 
         self.format_string = format_string
@@ -826,6 +1975,10 @@ class FilebotHandler(object):
         self.query_override = query_override
         self._mode = "rename"
         self.mode = mode
+        self.launch_profile = launch_profile
+        self.timeout = timeout
+        self.job_id = job_id
+        self.resource_policy = resource_policy
 
         self._populate_methods()
 
@@ -887,7 +2040,8 @@ class FilebotHandler(object):
     def _populate_methods(self):
         """populates the class methods with public functions from the module"""
         to_add = inspect.getmembers(sys.modules[__name__], inspect.isfunction)
-        to_add = [f[0] for f in to_add if not f[0].startswith("_")]
+        to_add = [f[0] for f in to_add
+                  if not f[0].startswith("_") and f[0] not in _NOT_HANDLER_METHODS]
         for func_name in to_add:
             func = getattr(sys.modules[__name__], func_name)
             self._add_function_as_method(func_name, func)
@@ -935,4 +2089,10 @@ class FilebotHandler(object):
         for arg in overrided_kwargs:
             kwargs_to_pass[arg] = overrided_kwargs[arg]
 
-        return function(*overrided_args, **kwargs_to_pass)
+        with _execution_context(
+            launch_profile=self.launch_profile,
+            timeout=self.timeout,
+            job_id=self.job_id,
+            resource_policy=self.resource_policy,
+        ):
+            return function(*overrided_args, **kwargs_to_pass)
@@ -0,0 +1,160 @@
+"""
+Token bucket rate limiting of FileBot runs per online database, so runs
+against a throttled database (eg: AniDB) queue up while runs against other
+databases keep going.
+"""
+from __future__ import absolute_import
+__author__ = 'laharah'
+
+from collections import deque
+
+# noinspection PyUnresolvedReferences
+from twisted.internet import defer, reactor
+
+from filebottool.common import LOG
+
+log = LOG
+
+# limits key used for runs that let filebot pick the database
+DEFAULT_KEY = "default"
+
+
+class TokenBucket(object):
+    """
+    Allows *burst* runs at once, refilling at *runs_per_minute*. Waiting
+    acquires are served in order.
+    """
+
+    def __init__(self, runs_per_minute, burst=1, clock=reactor):
+        self.clock = clock
+        self.rate = runs_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.last = clock.seconds()
+        self.waiting = deque()
+        self._call = None
+
+    def configure(self, runs_per_minute, burst=1):
+        self._refill()
+        self.rate = runs_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.tokens = min(self.tokens, self.burst)
+        self._reschedule()
+
+    def _refill(self):
+        now = self.clock.seconds()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def acquire(self):
+        """returns a deferred that fires when the run may start. Cancelling
+        it gives up the place in the queue."""
+        d = defer.Deferred(self._forget)
+        self.waiting.append(d)
+        self._drain()
+        return d
+
+    def _forget(self, d):
+        self.waiting.remove(d)
+        self._reschedule()
+
+    def _drain(self):
+        self._call = None
+        self._refill()
+        while self.waiting and self.tokens >= 1:
+            self.tokens -= 1
+            self.waiting.popleft().callback(None)
+        self._reschedule()
+
+    def _reschedule(self):
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
+        if self.waiting and self.rate > 0:
+            delay = (1 - self.tokens) / self.rate
+            self._call = self.clock.callLater(max(delay, 0), self._drain)
+
+    def cancel(self):
+        """stops the refill timer"""
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
+
+
+class RateLimiter(object):
+    """
+    Keeps a TokenBucket per database.
+
+    *limits* is a dictionary in format
+    {database: {"runs_per_minute": n, "burst": n}}. Databases without an entry
+    or with runs_per_minute <= 0 are not limited, runs without a database use
+    the DEFAULT_KEY entry.
+    """
+
+    def __init__(self, limits=None, clock=reactor):
+        self.clock = clock
+        self.buckets = {}
+        self.jobs = {}  # job_id: waiting deferreds
+        self.configure(limits or {})
+
+    def configure(self, limits):
+        limits = dict((database, limit) for database, limit in limits.items()
+                      if limit.get("runs_per_minute", 0) > 0)
+        for database in list(self.buckets):
+            if database not in limits:
+                bucket = self.buckets.pop(database)
+                bucket.cancel()
+                while bucket.waiting:  # no longer limited, let them run
+                    bucket.waiting.popleft().callback(None)
+        for database, limit in limits.items():
+            runs, burst = limit["runs_per_minute"], limit.get("burst", 1)
+            if database in self.buckets:
+                self.buckets[database].configure(runs, burst)
+            else:
+                self.buckets[database] = TokenBucket(runs, burst, self.clock)
+
+    def acquire(self, database, job_id=None):
+        """returns a deferred that fires when a run against *database* may
+        start. Waiting runs of a *job_id* can be dropped with *cancel_job*"""
+        bucket = self.buckets.get(database or DEFAULT_KEY)
+        if bucket is None:
+            return defer.succeed(None)
+        if bucket.waiting or bucket.tokens < 1:
+            log.debug("run against {0} waiting for the rate limit".format(
+                database or DEFAULT_KEY))
+        d = bucket.acquire()
+        if job_id is not None and not d.called:
+            job_ids = job_id if isinstance(job_id, (list, tuple, set)) else (job_id,)
+            for job_id in job_ids:
+                self.jobs.setdefault(job_id, set()).add(d)
+
+            def forget(result):
+                for job_id in job_ids:
+                    waiting = self.jobs.get(job_id, set())
+                    waiting.discard(d)
+                    if not waiting:
+                        self.jobs.pop(job_id, None)
+                return result
+            d.addBoth(forget)
+        return d
+
+    def cancel_job(self, job_id):
+        """drops the waiting runs of a job, their deferreds fail with
+        CancelledError. returns the number of runs dropped"""
+        waiting = list(self.jobs.pop(job_id, ()))
+        for d in waiting:
+            d.cancel()
+        return len(waiting)
+
+    def get_status(self):
+        """returns {database: {"tokens": n, "queued": n}}"""
+        status = {}
+        for database, bucket in self.buckets.items():
+            bucket._refill()
+            status[database] = {"tokens": round(bucket.tokens, 2),
+                                "queued": len(bucket.waiting)}
+        return status
+
+    def cancel(self):
+        for bucket in self.buckets.values():
+            bucket.cancel()
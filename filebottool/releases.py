@@ -0,0 +1,158 @@
+"""
+Classifies release names to pick the database and query FileBot should match
+them with.
+"""
+from __future__ import absolute_import
+__author__ = 'laharah'
+
+import os
+import re
+from collections import OrderedDict, namedtuple
+
+import six
+
+ReleaseInfo = namedtuple(
+    "ReleaseInfo", ["title", "year", "season", "episode", "absolute", "anime", "pack"]
+)
+
+_RELEASE_GROUP = re.compile(r"^\s*\[[^\]]+\]")
+_RELEASE_CRC = re.compile(r"[\[(][0-9A-Fa-f]{8}[\])]")
+_RELEASE_BRACKETS = re.compile(r"\[[^\]]*\]|\([^)]*\)")
+_RELEASE_SEASON_EPISODE = re.compile(
+    r"(?i)\bs(\d{1,2})[ ._-]?e(\d{1,3})\b|\b(\d{1,2})x(\d{2,3})\b"
+)
+_RELEASE_ABSOLUTE = re.compile(r"(?i)\s-\s(\d{1,4})(?:v\d)?\b|\bep?\s?(\d{2,4})\b")
+_RELEASE_YEAR = re.compile(r"\b(19\d{2}|20\d{2})\b")
+# season packs, eg: "Show.2008.Complete" or "Show S02"
+_RELEASE_PACK = re.compile(r"(?i)\b(?:complete|season\s*\d+|s\d{1,2})\b")
+_RELEASE_TAGS = re.compile(
+    r"(?i)\b(?:\d{3,4}p|[hx]\.?26[45]|hevc|bluray|blu-ray|bdrip|brrip|web-?dl|"
+    r"webrip|web|hdtv|dvdrip|remux|proper|repack)\b"
+)
+
+
+def classify_release(name):
+    """Parses a release or file name into its identifying parts
+
+    Args:
+        name: the file name or path of a release
+
+    Returns:
+        a ReleaseInfo namedtuple. Numbers are ints, missing parts are None.
+    """
+    name = os.path.basename(name)
+    root, ext = os.path.splitext(name)
+    if ext[1:].isalnum() and len(ext) <= 5:  # not eg: "Show.2008.Complete"
+        name = root
+    anime = bool(_RELEASE_GROUP.search(name) or _RELEASE_CRC.search(name))
+    match = _RELEASE_YEAR.search(" ".join(_RELEASE_BRACKETS.findall(name)))
+    year = int(match.group(1)) if match else None
+    name = _RELEASE_BRACKETS.sub(" ", name)
+    if " " not in name.strip():
+        name = re.sub(r"[._]", " ", name)
+
+    markers = [len(name)]
+    season = episode = absolute = None
+    match = _RELEASE_SEASON_EPISODE.search(name)
+    if match:
+        season = int(match.group(1) or match.group(3))
+        episode = int(match.group(2) or match.group(4))
+        markers.append(match.start())
+    else:
+        match = _RELEASE_ABSOLUTE.search(name)
+        if match:
+            absolute = int(match.group(1) or match.group(2))
+            markers.append(match.start())
+    pack = False
+    if episode is None and absolute is None:
+        match = _RELEASE_PACK.search(name)
+        if match:
+            pack = True
+            markers.append(match.start())
+    years = [m for m in _RELEASE_YEAR.finditer(name[: min(markers)]) if m.start() > 0]
+    if years and not year:
+        year = int(years[-1].group(1))
+        markers.append(years[-1].start())
+    match = _RELEASE_TAGS.search(name)
+    if match:
+        markers.append(match.start())
+
+    title = re.sub(r"\s+", " ", name[: min(markers)]).strip(" -")
+    return ReleaseInfo(title or None, year, season, episode, absolute, anime, pack)
+
+
+def classify_releases(targets):
+    """Classifies a batch of targets and picks the database for each
+
+    Files whose names don't identify them fall back on their folder name.
+    Folders are never classified as movies, they are usually season packs.
+
+    Args:
+        targets: file/folder or list of files/folders
+
+    Returns:
+        a list of (target, ReleaseInfo, database) tuples, database is None
+            if it could not be determined.
+    """
+    if isinstance(targets, six.string_types):
+        targets = [targets]
+    classified = []
+    for target in targets:
+        info = classify_release(target)
+        database = _release_database(info)
+        if database is None:
+            folder_info = classify_release(os.path.dirname(target))
+            if _release_database(folder_info):
+                info = folder_info
+                database = _release_database(info)
+        if database == "TheMovieDB" and os.path.isdir(target):
+            database = None
+        classified.append((target, info, database))
+    return classified
+
+
+def group_by_database(targets):
+    """Groups targets by the database and query filebot should use for them
+
+    Series are grouped per title and queried by it, with the year if the
+    release names one (eg: "Doctor Who (2005)"). Movies share a group with
+    no query. Unidentified files join the group of a file in the same
+    folder, or a group with no database or query.
+
+    Args:
+        targets: file/folder or list of files/folders
+
+    Returns:
+        a list of (database, query, [targets]) tuples
+    """
+    groups = OrderedDict()
+    unknown = []
+    folders = {}
+    for target, info, database in classify_releases(targets):
+        if database is None:
+            unknown.append(target)
+            continue
+        query = None
+        if database != "TheMovieDB":
+            query = info.title
+            if info.year:
+                query = "{0} ({1})".format(query, info.year)
+        key = (database, query.lower() if query else None)
+        groups.setdefault(key, (database, query, []))[2].append(target)
+        folders.setdefault(os.path.dirname(target), key)
+
+    for target in unknown:
+        key = folders.get(os.path.dirname(target), (None, None))
+        groups.setdefault(key, (None, None, []))[2].append(target)
+    return list(groups.values())
+
+
+def _release_database(info):
+    """picks the database for a ReleaseInfo, or None if unsure"""
+    if info.anime and (info.absolute or info.episode):
+        return "AniDB"
+    if info.episode is not None:
+        return "TheTVDB"
+    if info.year and info.absolute is None and not info.pack:
+        return "TheMovieDB"
+    return None
@@ -0,0 +1,61 @@
+"""
+Daily schedule windows, eg: "02:00-06:00", used to hold heavy auto sort work
+until off-peak hours.
+"""
+from __future__ import absolute_import
+__author__ = 'laharah'
+
+import re
+import datetime
+
+from filebottool.common import LOG
+
+log = LOG
+
+_WINDOW = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$")
+
+
+def parse_window(window):
+    """
+    parses a window string in format "HH:MM-HH:MM" in local time. Windows
+    ending before they start run past midnight, "00:00-24:00" is always
+    open. Empty windows (start equals end) are invalid.
+    Args:
+        window: window string
+
+    Returns: tuple in format (start_minute, end_minute) counted from midnight
+    Raises: ValueError on invalid windows
+    """
+    match = _WINDOW.match(window or "")
+    if not match:
+        raise ValueError("'{0}' is not a valid schedule window".format(window))
+    start_h, start_m, end_h, end_m = (int(g) for g in match.groups())
+    if start_h > 23 or end_h > 24 or start_m > 59 or end_m > 59:
+        raise ValueError("'{0}' is not a valid schedule window".format(window))
+    start, end = start_h * 60 + start_m, min(end_h * 60 + end_m, 24 * 60)
+    if start == end:
+        raise ValueError("schedule window '{0}' never opens".format(window))
+    return start, end
+
+
+def is_open(window, now=None):
+    """returns True if *now* (default: the current local time) is inside
+    the window"""
+    start, end = parse_window(window)
+    now = now or datetime.datetime.now()
+    minute = now.hour * 60 + now.minute
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+
+def seconds_until_open(window, now=None):
+    """returns the seconds until the window next opens, 0 if it is open"""
+    if is_open(window, now):
+        return 0
+    start, _ = parse_window(window)
+    now = now or datetime.datetime.now()
+    opens = now.replace(hour=start // 60, minute=start % 60, second=0, microsecond=0)
+    if opens <= now:
+        opens += datetime.timedelta(days=1)
+    return (opens - now).total_seconds()
@@ -0,0 +1,102 @@
+"""
+Persistent cache of subtitle lookups, keyed by OpenSubtitles file hash and
+language. Used to skip asking OpenSubtitles again about files that were
+checked recently.
+"""
+from __future__ import absolute_import
+__author__ = 'laharah'
+
+import os
+import time
+import struct
+
+from filebottool.common import LOG
+
+log = LOG
+
+HASH_BLOCK_SIZE = 64 * 1024
+
+
+def opensubtitles_hash(path):
+    """
+    computes the OpenSubtitles hash of a file: its size plus the 64 bit
+    little-endian words of its first and last 64KiB.
+    Args:
+        path: path of the video file
+
+    Returns: 16 character hex string
+    """
+    size = os.path.getsize(path)
+    file_hash = size
+    with open(path, 'rb') as f:
+        offsets = [0]
+        if size > HASH_BLOCK_SIZE:
+            offsets.append(max(size - HASH_BLOCK_SIZE, 0))
+        for offset in offsets:
+            f.seek(offset)
+            block = f.read(HASH_BLOCK_SIZE)
+            block += b"\0" * (-len(block) % 8)
+            for word in struct.unpack("<{0}Q".format(len(block) // 8), block):
+                file_hash = (file_hash + word) & 0xFFFFFFFFFFFFFFFF
+    return "{0:016x}".format(file_hash)
+
+
+def hash_files(paths):
+    """returns {path: hash} for every path that could be read. Blocking."""
+    hashes = {}
+    for path in paths:
+        try:
+            hashes[path] = opensubtitles_hash(path)
+        except (IOError, OSError):
+            continue
+    return hashes
+
+
+class SubtitleCache(object):
+    """
+    Remembers which files had subtitles in which languages.
+
+    *config* is a deluge config object, entries are kept under its "entries"
+    key in format {"hash:language": {"found": [subtitles], "checked": time}}.
+    Entries older than *ttl* seconds are looked up again.
+    """
+
+    def __init__(self, config, ttl=7 * 24 * 60 * 60):
+        self.config = config
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(file_hash, language):
+        return "{0}:{1}".format(file_hash, language or "default")
+
+    def needs_lookup(self, file_hash, language):
+        """returns False if the file was checked for *language* within the ttl
+        and either had no subtitles or still has the ones downloaded"""
+        key = self._key(file_hash, language)
+        entry = self.config["entries"].get(key)
+        if not entry:
+            return True
+        if time.time() - entry["checked"] > self.ttl:
+            del self.config["entries"][key]
+            return True
+        if entry["found"] and not any(os.path.exists(s) for s in entry["found"]):
+            return True
+        return False
+
+    def record(self, file_hash, language, subtitles):
+        """records the result of a lookup, *subtitles* empty for a miss"""
+        self.config["entries"][self._key(file_hash, language)] = {
+            "found": list(subtitles),
+            "checked": time.time(),
+        }
+
+    def prune(self):
+        """drops expired entries"""
+        now = time.time()
+        expired = [key for key, entry in self.config["entries"].items()
+                   if now - entry["checked"] > self.ttl]
+        for key in expired:
+            del self.config["entries"][key]
+
+    def save(self):
+        self.config.save()
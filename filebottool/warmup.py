@@ -0,0 +1,64 @@
+"""
+Predictive FileBot warm-up. Decides when to launch a cheap FileBot run ahead
+of expected auto sort completions, so the JVM, its jars and FileBot's caches
+are hot when the real run starts.
+"""
+from __future__ import absolute_import
+__author__ = 'laharah'
+
+import time
+
+from filebottool.common import LOG
+
+log = LOG
+
+
+class WarmupPolicy(object):
+    """
+    Tracks warm-ups and how useful they were.
+
+    A warm-up is considered hot for *ttl* seconds. Completions inside that
+    time count as hits, completions outside of it as misses, and warm-ups
+    that saw no completion before the next one as wasted.
+    """
+
+    def __init__(self, window=120, interval=240, ttl=300):
+        self.window = window
+        self.interval = interval
+        self.ttl = ttl
+        self.last_warmup = None
+        self._last_warmup_hit = True
+        self.stats = {"warmups": 0, "hits": 0, "misses": 0, "wasted": 0}
+
+    def expected_soon(self, eta):
+        """returns True if a torrent with this libtorrent eta (0 = unknown)
+        is expected to complete within the warm-up window"""
+        return 0 < eta <= self.window
+
+    def should_warm(self, now=None):
+        """returns True if a new warm-up should start for expected completions"""
+        now = now or time.time()
+        return self.last_warmup is None or now - self.last_warmup >= self.interval
+
+    def record_warmup(self, now=None):
+        if not self._last_warmup_hit:
+            self.stats["wasted"] += 1
+        self.last_warmup = now or time.time()
+        self._last_warmup_hit = False
+        self.stats["warmups"] += 1
+
+    def record_completion(self, now=None):
+        """records an auto sort completion as a hit or miss"""
+        now = now or time.time()
+        if self.last_warmup is not None and now - self.last_warmup <= self.ttl:
+            self.stats["hits"] += 1
+            self._last_warmup_hit = True
+        else:
+            self.stats["misses"] += 1
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        completions = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = float(stats["hits"]) / completions if completions else None
+        stats["last_warmup"] = self.last_warmup
+        return stats
@@ -0,0 +1,49 @@
+from __future__ import absolute_import
+import unittest
+import warnings
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    from filebottool import circuit
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.breaker = circuit.CircuitBreaker(cooldown=60)
+        self.breaker.record_failure(circuit.FATAL, "filebot not found")
+        self.opened = self.breaker.opened_at
+
+    def test_open_refuses_jobs(self):
+        self.assertFalse(self.breaker.allow(self.opened + 10))
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+
+    def test_half_open_allows_one_trial(self):
+        self.assertTrue(self.breaker.allow(self.opened + 60))
+        self.assertEqual(self.breaker.state, circuit.HALF_OPEN)
+        self.assertFalse(self.breaker.allow(self.opened + 61))
+        self.assertFalse(self.breaker.allow(self.opened + 62))
+
+    def test_released_trial(self):
+        self.assertTrue(self.breaker.allow(self.opened + 60))
+        self.breaker.release()
+        self.assertTrue(self.breaker.allow(self.opened + 61))
+        self.assertFalse(self.breaker.allow(self.opened + 62))
+
+    def test_stale_trial(self):
+        self.assertTrue(self.breaker.allow(self.opened + 60))
+        self.assertFalse(self.breaker.allow(self.opened + 100))
+        self.assertTrue(self.breaker.allow(self.opened + 120))
+
+    def test_trial_result(self):
+        self.assertTrue(self.breaker.allow(self.opened + 60))
+        self.assertTrue(self.breaker.record_success())
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.record_failure(circuit.LICENSE, "unregistered")
+        self.assertFalse(self.breaker.allow(self.breaker.opened_at + 1))
+        self.assertEqual(self.breaker.get_status()["failures"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
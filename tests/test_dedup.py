@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+
+from filebottool import dedup
+
+
+class FakeConfig(dict):
+    def save(self):
+        pass
+
+
+class DedupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def make_file(self, name, data):
+        path = os.path.join(self.folder, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_fingerprint_files(self):
+        path = self.make_file("a.mkv", b"x" * 10)
+        missing = os.path.join(self.folder, "missing.mkv")
+        fingerprints = dedup.fingerprint_files([path, missing])
+        self.assertEqual(fingerprints[path], (10, dedup.partial_hash(path)))
+        self.assertIsNone(fingerprints[missing])
+
+    def test_partial_hash_collision(self):
+        # same head, middle and tail blocks, different unsampled bytes
+        block = dedup.BLOCK_SIZE
+        first = bytearray(b"a" * (block * 5))
+        second = bytearray(first)
+        second[block + 10] = ord("b")
+        first = self.make_file("first.mkv", bytes(first))
+        second = self.make_file("second.mkv", bytes(second))
+        self.assertEqual(dedup.partial_hash(first), dedup.partial_hash(second))
+        self.assertFalse(dedup.same_content(first, second))
+
+    def test_link_existing(self):
+        source = self.make_file("source.mkv", b"content")
+        existing = self.make_file("existing.mkv", b"content")
+        dest = os.path.join(self.folder, "library", "dest.mkv")
+        self.assertEqual(dedup.link_existing(source, existing, dest), "linked")
+        self.assertTrue(os.path.samefile(existing, dest))
+        self.assertEqual(dedup.link_existing(source, existing, dest), "skipped")
+
+    def test_link_existing_different_content(self):
+        source = self.make_file("source.mkv", b"content")
+        existing = self.make_file("existing.mkv", b"CONTENT")
+        dest = os.path.join(self.folder, "dest.mkv")
+        self.assertIsNone(dedup.link_existing(source, existing, dest))
+        self.assertFalse(os.path.exists(dest))
+
+    def test_index_drops_stale_entries(self):
+        path = self.make_file("library.mkv", b"content")
+        index = dedup.DedupIndex(FakeConfig(index={}))
+        fingerprint = (7, dedup.partial_hash(path))
+        index.add(fingerprint, path)
+        self.assertEqual(index.lookup(fingerprint), path)
+        os.remove(path)
+        self.assertIsNone(index.lookup(fingerprint))
+        self.assertEqual(index.config["index"], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
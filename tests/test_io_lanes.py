@@ -0,0 +1,48 @@
+from __future__ import absolute_import
+import tempfile
+import unittest
+
+from twisted.internet import defer
+
+from filebottool import io_lanes
+
+
+class SharedLaneTestCase(unittest.TestCase):
+    def setUp(self):
+        self.lanes = io_lanes.IOLanes(per_device=1)
+        self.destination = tempfile.gettempdir()
+
+    def test_runs_of_one_job_share_the_slot(self):
+        first = self.lanes.share(self.destination)
+        second = self.lanes.share(self.destination)
+        runs = [defer.Deferred(), defer.Deferred()]
+        started = []
+
+        def run(index):
+            started.append(index)
+            return runs[index]
+
+        chunk_a = first.run(run, 0)
+        chunk_b = first.run(run, 1)
+        other = second.run(lambda: "other")
+        self.assertEqual(started, [0, 1])  # chunks don't queue behind each other
+        self.assertFalse(other.called)
+
+        runs[0].callback("a")
+        runs[1].callback("b")
+        self.assertEqual((chunk_a.result, chunk_b.result), ("a", "b"))
+        self.assertFalse(other.called)  # held until the job releases it
+        first.release()
+        self.assertEqual(other.result, "other")
+        second.release()
+        status = list(self.lanes.get_status().values())[0]
+        self.assertEqual((status["running"], status["queued"]), (0, 0))
+
+    def test_release_unused(self):
+        lane = self.lanes.share(self.destination)
+        lane.release()
+        self.assertEqual(self.lanes.share(self.destination).run(lambda: 1).result, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+from __future__ import absolute_import
+import unittest
+
+from filebottool import match_cache
+
+
+class FakeConfig(dict):
+    saves = 0
+
+    def save(self):
+        self.saves += 1
+
+
+class ReleaseKeyTestCase(unittest.TestCase):
+    def test_episode(self):
+        self.assertEqual(match_cache.release_key("Doctor.Who.S01E01.720p.mkv"),
+                         "doctor who")
+        self.assertEqual(match_cache.release_key("Doctor.Who.2005.S01E01.720p.mkv"),
+                         "doctor who (2005)")
+        self.assertEqual(match_cache.release_key("Doctor.Who.1963.S01E01.mkv"),
+                         "doctor who (1963)")
+        self.assertEqual(match_cache.release_key("Show.720p.S01E01.mkv"), "show")
+        self.assertEqual(match_cache.release_key("/tv/[Grp] Some Show - 05 [ABCD1234].mkv"),
+                         "some show")
+
+    def test_movie(self):
+        self.assertEqual(match_cache.release_key("Avatar.2009.1080p.BluRay.mkv"),
+                         "avatar (2009)")
+
+    def test_has_year(self):
+        self.assertTrue(match_cache.has_year("Doctor Who (2005)"))
+        self.assertFalse(match_cache.has_year("Doctor Who"))
+        self.assertFalse(match_cache.has_year(None))
+
+    def test_unknown(self):
+        self.assertIsNone(match_cache.release_key("random_file.mkv"))
+        self.assertIsNone(match_cache.release_key("2009.mkv"))
+
+    def test_common_release_key(self):
+        self.assertEqual(match_cache.common_release_key(
+            ["Show.S01E01.mkv", "Show.S01E02.mkv", "readme.txt"]), "show")
+        self.assertIsNone(match_cache.common_release_key(
+            ["Show.S01E01.mkv", "Other.S01E02.mkv"]))
+
+    def test_make_key_ignores_action(self):
+        first = match_cache.make_key(["a", "b"], {"rename_action": "move", "db": 1})
+        second = match_cache.make_key(["b", "a"], {"rename_action": "copy", "db": 1})
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, match_cache.make_key(["a", "b"], {"db": 2}))
+
+
+class NegativeCacheTestCase(unittest.TestCase):
+    def test_backoff(self):
+        cache = match_cache.NegativeCache(ttl=10, max_ttl=25)
+        self.assertIsNone(cache.check("key"))
+        cache.record_failure("key", "no match")
+        self.assertEqual(cache.check("key"), "no match")
+        first = cache.entries["key"]["expires"]
+        cache.record_failure("key", "no match")
+        cache.record_failure("key", "no match")
+        self.assertAlmostEqual(cache.entries["key"]["expires"] - first, 15, delta=1)
+        cache.clear("key")
+        self.assertIsNone(cache.check("key"))
+
+
+class MatchMemoTestCase(unittest.TestCase):
+    def setUp(self):
+        self.memo = match_cache.MatchMemo(FakeConfig(memo={}, candidates={}),
+                                          confirmations=2)
+
+    def test_learn(self):
+        self.memo.learn("show", "TheTVDB", "Show")
+        self.assertEqual(self.memo.lookup("show"), ("TheTVDB", "Show"))
+        self.memo.forget("show")
+        self.assertIsNone(self.memo.lookup("show"))
+
+    def test_observe_needs_repeats(self):
+        self.memo.observe("show", "TheTVDB", "Show")
+        self.assertIsNone(self.memo.lookup("show"))
+        self.memo.observe("show", "TheTVDB", "Show")
+        self.assertEqual(self.memo.lookup("show"), ("TheTVDB", "Show"))
+        self.assertEqual(self.memo.config["candidates"], {})
+
+    def test_observe_disagreement_resets(self):
+        self.memo.observe("show", "TheTVDB", "Show")
+        self.memo.observe("show", "TheTVDB", "Show (2005)")
+        self.assertIsNone(self.memo.lookup("show"))
+        self.memo.observe("show", "TheTVDB", "Show (2005)")
+        self.assertEqual(self.memo.lookup("show"), ("TheTVDB", "Show (2005)"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,257 @@
+from __future__ import absolute_import
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+import warnings
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    from filebottool import pyfilebot
+
+
+class PreviewFormatStringTestCase(unittest.TestCase):
+    def preview(self, format_string):
+        return pyfilebot.preview_format_string(format_string, "Citizen Kane.avi")
+
+    def test_bindings(self):
+        self.assertEqual(self.preview("{n} ({y})"), "Citizen Kane (1941).avi")
+        self.assertEqual(self.preview("Movies/{n}/{n}"),
+                         "Movies/Citizen Kane/Citizen Kane.avi")
+
+    def test_methods(self):
+        self.assertEqual(self.preview("{n.lower().space('.')}"), "citizen.kane.avi")
+        self.assertEqual(self.preview("{n.replace('Kane', 'K') + ' ' + y}"),
+                         "Citizen K 1941.avi")
+
+    def test_undefined_binding_blanks_expression(self):
+        self.assertEqual(self.preview("{n}{' - ' + t}"), "Citizen Kane.avi")
+
+    def test_unsupported(self):
+        self.assertIsNone(self.preview("{n} {d}"))
+        self.assertIsNone(self.preview("{n.foo()}"))
+        self.assertIsNone(self.preview("{n.replace('a' 'b')}"))
+        self.assertIsNone(self.preview("{n.replace('a',)}"))
+        self.assertIsNone(self.preview("{n.replace(y, 'b')}"))
+        self.assertIsNone(self.preview("{n +}"))
+
+    def test_relative_destination(self):
+        old = os.path.abspath("Citizen Kane.avi")
+        new = os.path.join(os.path.dirname(old), "Citizen Kane (1941).avi")
+        self.assertEqual(pyfilebot._relative_destination(old, new),
+                         "Citizen Kane (1941).avi")
+        outside = os.path.join(os.path.dirname(os.path.dirname(old)), "other",
+                               "Citizen Kane.avi")
+        self.assertEqual(pyfilebot._relative_destination(old, outside), outside)
+        self.assertEqual(pyfilebot._relative_destination("a.avi", "b.avi"), "b.avi")
+
+
+class FilebotHandlerTestCase(unittest.TestCase):
+    def test_job_functions_are_not_methods(self):
+        handler = pyfilebot.FilebotHandler()
+        self.assertTrue(hasattr(handler, "rename"))
+        for name in ("cancel_job", "clear_job", "job_running", "merge_results"):
+            self.assertFalse(hasattr(handler, name), name)
+
+
+class ParseOutputTestCase(unittest.TestCase):
+    def test_structured(self):
+        data = "\n".join([
+            'Rename movies using [TheMovieDB]',
+            '{"event": "move", "from": "/a/x.avi", "to": "/b/X (1941).avi"}',
+            '{"event": "skip", "file": "/a/y.avi", "reason": "exists"}',
+            '{"event": "summary", "processed": 1}',
+        ])
+        self.assertEqual(pyfilebot.parse_structured_output(data),
+                         (1, [("/a/x.avi", "/b/X (1941).avi")], ["/a/y.avi"]))
+
+    def test_test_action_falls_back_to_log_lines(self):
+        data = "\n".join([
+            'Rename movies using [TheMovieDB]',
+            '[TEST] from [/a/x.avi] to [/b/X (1941).avi]',
+            'Processed 1 files',
+        ])
+        self.assertIsNone(pyfilebot.parse_structured_output(data))
+        self.assertEqual(pyfilebot.parse_filebot(data),
+                         (1, [("/a/x.avi", "/b/X (1941).avi")], []))
+
+
+@unittest.skipIf(os.name == "nt", "uses a shell script as filebot")
+class RenameOutcomeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.saved = (pyfilebot.FILEBOT_EXE, pyfilebot.WORKER_DATA_ROOT)
+        pyfilebot.WORKER_DATA_ROOT = None
+        pyfilebot.FILEBOT_EXE = os.path.join(self.folder, "filebot")
+
+    def tearDown(self):
+        pyfilebot.FILEBOT_EXE, pyfilebot.WORKER_DATA_ROOT = self.saved
+        shutil.rmtree(self.folder)
+
+    def outcome(self, output, exit_code):
+        with open(pyfilebot.FILEBOT_EXE, "w") as f:
+            f.write("#!/bin/sh\necho '{0}'\nexit {1}\n".format(output, exit_code))
+        os.chmod(pyfilebot.FILEBOT_EXE, 0o755)
+        match_info = {}
+        self.assertRaises(pyfilebot.FilebotNoMatchError, pyfilebot.rename,
+                          os.path.join(self.folder, "x.avi"), rename_action="test",
+                          match_info=match_info)
+        return match_info["conclusive"]
+
+    def test_no_match_is_conclusive(self):
+        self.assertTrue(self.outcome('{"event": "summary", "processed": 0}', 0))
+
+    def test_errors_are_not(self):
+        self.assertFalse(self.outcome(
+            '{"event": "error", "message": "Connection timed out"}', 0))
+        self.assertFalse(self.outcome("Processed 0 files", 1))
+
+
+class WorkerCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.saved = (pyfilebot.FILEBOT_DATA_DIR, pyfilebot.WORKER_DATA_ROOT,
+                      pyfilebot.CACHE_MERGE_INTERVAL)
+        pyfilebot.FILEBOT_DATA_DIR = os.path.join(self.folder, "filebot")
+        pyfilebot.WORKER_DATA_ROOT = os.path.join(self.folder, "workers")
+        pyfilebot.CACHE_MERGE_INTERVAL = 0
+        self.write(os.path.join(pyfilebot.FILEBOT_DATA_DIR, "cache", "old.data"))
+        self.write(os.path.join(pyfilebot.FILEBOT_DATA_DIR, "license.txt"))
+
+    def tearDown(self):
+        (pyfilebot.FILEBOT_DATA_DIR, pyfilebot.WORKER_DATA_ROOT,
+         pyfilebot.CACHE_MERGE_INTERVAL) = self.saved
+        shutil.rmtree(self.folder)
+
+    @staticmethod
+    def write(path, data="data"):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(data)
+
+    def test_seed_and_merge(self):
+        worker = pyfilebot._acquire_worker()
+        data_dir = pyfilebot._worker_data_dir(worker)
+        self.assertTrue(os.path.exists(os.path.join(data_dir, "cache", "old.data")))
+        self.assertEqual(sorted(os.listdir(data_dir)), ["cache", "tmp"])
+        env = pyfilebot._process_environment(worker)
+        self.assertIn("-Dapplication.cache=" + os.path.join(data_dir, "cache"),
+                      env["FILEBOT_OPTS"])
+        self.assertNotIn("application.dir", env["FILEBOT_OPTS"])
+        self.assertEqual(pyfilebot._acquire_worker(), worker + 1)
+        pyfilebot._release_worker(worker + 1)
+
+        os.remove(os.path.join(data_dir, "cache", "old.data"))
+        self.write(os.path.join(data_dir, "cache", "new.data"))
+        pyfilebot._release_worker(worker)
+
+        shared = pyfilebot.FILEBOT_DATA_DIR
+        self.assertEqual(os.listdir(os.path.join(shared, "cache")), ["new.data"])
+        self.assertEqual(sorted(os.listdir(shared)), ["cache", "license.txt"])
+        self.assertNotIn(worker, pyfilebot._busy_workers)
+
+
+@unittest.skipIf(os.name == "nt", "uses a shell script as filebot")
+class ClassDataSharingTestCase(unittest.TestCase):
+    # fake filebot: "-version" with ArchiveClassesAtExit writes the archive,
+    # any other launch records its JAVA_OPTS
+    SCRIPT = """#!/bin/sh
+case "$JAVA_OPTS" in
+  *ArchiveClassesAtExit=*) {0}
+esac
+echo "$JAVA_OPTS" > "{1}"
+"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.saved = (pyfilebot.FILEBOT_EXE, pyfilebot.LAUNCH_DATA_DIR,
+                      pyfilebot.WORKER_DATA_ROOT, dict(pyfilebot._cds_state))
+        pyfilebot.LAUNCH_DATA_DIR = os.path.join(self.folder, "launch")
+        pyfilebot.WORKER_DATA_ROOT = None
+        pyfilebot._cds_state.update(version="4.9", generating=set(), unsupported=False)
+        self.options_file = os.path.join(self.folder, "options")
+        self.profile = {"class_data_sharing": True}
+
+    def tearDown(self):
+        (pyfilebot.FILEBOT_EXE, pyfilebot.LAUNCH_DATA_DIR,
+         pyfilebot.WORKER_DATA_ROOT, cds_state) = self.saved
+        pyfilebot._cds_state.update(cds_state)
+        shutil.rmtree(self.folder)
+
+    def fake_filebot(self, on_archive):
+        path = os.path.join(self.folder, "filebot")
+        with open(path, "w") as f:
+            f.write(self.SCRIPT.format(on_archive, self.options_file))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        pyfilebot.FILEBOT_EXE = path
+
+    def launch(self):
+        archive = pyfilebot._cds_archive_path()
+        pyfilebot._cds_state["generating"].add(archive)  # no background run
+        self.assertEqual(pyfilebot._launch_options(self.profile), [])
+        pyfilebot._generate_cds_archive(archive)
+        with pyfilebot._execution_context(launch_profile=self.profile):
+            pyfilebot._execute(["-script", "fn:sysinfo"])
+        with open(self.options_file) as f:
+            return f.read()
+
+    def test_supported(self):
+        self.fake_filebot('echo archive > "${JAVA_OPTS#*=}"; exit 0 ;;')
+        options = self.launch()
+        self.assertIn("-XX:SharedArchiveFile=", options)
+        self.assertNotIn("ArchiveClassesAtExit", options)
+        self.assertFalse(pyfilebot._cds_state["unsupported"])
+
+    def test_unsupported(self):
+        self.fake_filebot('exit 1 ;;')
+        self.assertEqual(self.launch().strip(), "")
+        self.assertTrue(pyfilebot._cds_state["unsupported"])
+        self.assertEqual(pyfilebot._cds_state["generating"], set())
+
+
+@unittest.skipIf(os.name == "nt", "cgroups are linux only")
+class CgroupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.saved = (pyfilebot.FILEBOT_EXE, pyfilebot.CGROUP_ROOT,
+                      pyfilebot.RESOURCE_POLICIES, pyfilebot.WORKER_DATA_ROOT)
+        pyfilebot.CGROUP_ROOT = os.path.join(self.folder, "cgroup")
+        os.mkdir(pyfilebot.CGROUP_ROOT)
+        pyfilebot.RESOURCE_POLICIES = {"default": {}, "slow": {
+            "cgroup": {"cpu.max": "50000 100000"}}}
+        pyfilebot.WORKER_DATA_ROOT = None
+        pyfilebot.reset_cgroups()
+        pyfilebot.FILEBOT_EXE = os.path.join(self.folder, "filebot")
+        with open(pyfilebot.FILEBOT_EXE, "w") as f:
+            f.write("#!/bin/sh\necho $$\n")
+        os.chmod(pyfilebot.FILEBOT_EXE, 0o755)
+
+    def tearDown(self):
+        (pyfilebot.FILEBOT_EXE, pyfilebot.CGROUP_ROOT,
+         pyfilebot.RESOURCE_POLICIES, pyfilebot.WORKER_DATA_ROOT) = self.saved
+        pyfilebot.reset_cgroups()
+        shutil.rmtree(self.folder)
+
+    def test_joins_before_exec(self):
+        with pyfilebot._execution_context(resource_policy="slow"):
+            _, pid, _ = pyfilebot._execute(["-version"])
+        group = os.path.join(pyfilebot.CGROUP_ROOT, "filebottool-slow")
+        with open(os.path.join(group, "cpu.max")) as f:
+            self.assertEqual(f.read(), "50000 100000")
+        with open(os.path.join(group, "cgroup.procs")) as f:
+            self.assertEqual(f.read().strip(), pid.strip())
+
+    def test_reset_removes_stale_groups(self):
+        stale = os.path.join(pyfilebot.CGROUP_ROOT, "filebottool-old")
+        other = os.path.join(pyfilebot.CGROUP_ROOT, "other")
+        os.mkdir(stale)
+        os.mkdir(other)
+        pyfilebot.reset_cgroups()
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(other))
+
+
+if __name__ == '__main__':
+    unittest.main()
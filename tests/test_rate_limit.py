@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+import unittest
+
+from twisted.internet import defer, task
+
+from filebottool import rate_limit
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.limiter = rate_limit.RateLimiter(
+            {"AniDB": {"runs_per_minute": 2, "burst": 1},
+             "TheTVDB": {"runs_per_minute": 0}}, clock=self.clock)
+
+    def tearDown(self):
+        self.limiter.cancel()
+
+    def test_unlimited(self):
+        self.assertTrue(self.limiter.acquire("TheTVDB").called)
+        self.assertTrue(self.limiter.acquire("TheMovieDB").called)
+
+    def test_token_bucket(self):
+        first = self.limiter.acquire("AniDB")
+        second = self.limiter.acquire("AniDB")
+        self.assertTrue(first.called)
+        self.assertFalse(second.called)
+        self.clock.advance(29)
+        self.assertFalse(second.called)
+        self.clock.advance(1)
+        self.assertTrue(second.called)
+
+    def test_cancel_job(self):
+        self.limiter.acquire("AniDB", job_id="a")
+        waiting = self.limiter.acquire("AniDB", job_id="a")
+        other = self.limiter.acquire("AniDB", job_id=("b", "c"))
+        failures = []
+        waiting.addErrback(failures.append)
+        self.assertEqual(self.limiter.cancel_job("a"), 1)
+        self.assertTrue(failures[0].check(defer.CancelledError))
+        self.assertEqual(self.limiter.get_status()["AniDB"]["queued"], 1)
+        self.assertEqual(self.limiter.cancel_job("a"), 0)
+
+        self.clock.advance(30)  # the cancelled run gave up its place
+        self.assertTrue(other.called)
+        self.assertEqual(self.limiter.jobs, {})
+
+    def test_unlimit_releases_waiters(self):
+        self.limiter.acquire("AniDB")
+        waiting = self.limiter.acquire("AniDB")
+        self.limiter.configure({})
+        self.assertTrue(waiting.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+
+from filebottool import releases
+
+
+class ClassifyReleaseTestCase(unittest.TestCase):
+    def test_episode(self):
+        info = releases.classify_release("Doctor.Who.2005.S01E01.720p.HDTV.mkv")
+        self.assertEqual(info.title, "Doctor Who")
+        self.assertEqual(info.year, 2005)
+        self.assertEqual((info.season, info.episode), (1, 1))
+        self.assertEqual(releases._release_database(info), "TheTVDB")
+
+    def test_anime(self):
+        info = releases.classify_release("[Group] Some Show - 05 [ABCD1234].mkv")
+        self.assertEqual(info.title, "Some Show")
+        self.assertEqual(info.absolute, 5)
+        self.assertEqual(releases._release_database(info), "AniDB")
+
+    def test_movie(self):
+        info = releases.classify_release("Avatar.2009.1080p.BluRay.x264.mkv")
+        self.assertEqual((info.title, info.year), ("Avatar", 2009))
+        self.assertEqual(releases._release_database(info), "TheMovieDB")
+
+    def test_season_pack_is_not_a_movie(self):
+        for name in ("Show.2008.Complete", "Show.2008.S02.720p"):
+            info = releases.classify_release(name)
+            self.assertTrue(info.pack, name)
+            self.assertEqual(info.title, "Show")
+            self.assertIsNone(releases._release_database(info), name)
+
+
+class GroupByDatabaseTestCase(unittest.TestCase):
+    def test_series_query_keeps_year(self):
+        groups = releases.group_by_database([
+            "/tv/Doctor.Who.2005.S01E01.mkv", "/tv/Doctor.Who.2005.S01E02.mkv",
+            "/tv/Avatar.2009.1080p.mkv", "/tv/notes.txt"])
+        self.assertEqual(groups, [
+            ("TheTVDB", "Doctor Who (2005)", ["/tv/Doctor.Who.2005.S01E01.mkv",
+                                              "/tv/Doctor.Who.2005.S01E02.mkv",
+                                              "/tv/notes.txt"]),
+            ("TheMovieDB", None, ["/tv/Avatar.2009.1080p.mkv"]),
+        ])
+
+    def test_folders_are_not_movies(self):
+        root = tempfile.mkdtemp()
+        try:
+            folder = os.path.join(root, "Some.Release.2008.1080p")
+            os.mkdir(folder)
+            classified = releases.classify_releases([folder])
+            self.assertIsNone(classified[0][2])
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    unittest.main()
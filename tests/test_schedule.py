@@ -0,0 +1,50 @@
+from __future__ import absolute_import
+import datetime
+import unittest
+
+from filebottool import auto_sort
+from filebottool import schedule
+
+
+def at(hour, minute=0):
+    return datetime.datetime(2020, 1, 1, hour, minute)
+
+
+class ScheduleTestCase(unittest.TestCase):
+    def test_parse_window(self):
+        self.assertEqual(schedule.parse_window("02:00-06:30"), (120, 390))
+        self.assertEqual(schedule.parse_window(" 0:00 - 24:00 "), (0, 1440))
+        for window in ("", None, "2-6", "25:00-06:00", "02:60-06:00",
+                       "00:00-00:00", "03:15-03:15"):
+            self.assertRaises(ValueError, schedule.parse_window, window)
+
+    def test_is_open(self):
+        self.assertTrue(schedule.is_open("02:00-06:00", at(2)))
+        self.assertTrue(schedule.is_open("02:00-06:00", at(5, 59)))
+        self.assertFalse(schedule.is_open("02:00-06:00", at(6)))
+        self.assertTrue(schedule.is_open("00:00-24:00", at(23, 59)))
+
+    def test_past_midnight(self):
+        self.assertTrue(schedule.is_open("22:00-02:00", at(23)))
+        self.assertTrue(schedule.is_open("22:00-02:00", at(1)))
+        self.assertFalse(schedule.is_open("22:00-02:00", at(12)))
+
+    def test_seconds_until_open(self):
+        self.assertEqual(schedule.seconds_until_open("02:00-06:00", at(3)), 0)
+        self.assertEqual(schedule.seconds_until_open("02:00-06:00", at(1, 30)),
+                         30 * 60)
+        self.assertEqual(schedule.seconds_until_open("02:00-06:00", at(7)),
+                         19 * 60 * 60)
+
+
+class RuleKeyTestCase(unittest.TestCase):
+    def test_ignores_rule_id(self):
+        rule = [0, "label", "is exactly", "anime", "Anime"]
+        renumbered = [3] + rule[1:]
+        self.assertEqual(auto_sort.rule_key(rule), auto_sort.rule_key(renumbered))
+        self.assertNotEqual(auto_sort.rule_key(rule),
+                            auto_sort.rule_key(rule[:4] + ["TV"]))
+
+
+if __name__ == '__main__':
+    unittest.main()